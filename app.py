@@ -1,36 +1,105 @@
-from flask import Flask, send_from_directory
+import os
+
+from flask import Flask, Response, abort, request
+
+from scripts.site_index import SiteIndex
 
 app = Flask(__name__)
 
+# Vendored files and figure bases carry their version in the name, so they never change
+VENDOR_MAX_AGE = 365 * 24 * 3600
+
+# Pages and figures change once per build, vendored files never; both are read
+# into memory at startup and refreshed when a new build's manifest appears.
+# Relative to the app, the WSGI server's working directory can be anywhere
+pages = SiteIndex(os.path.join(app.root_path, "static_html"))
+vendor_files = SiteIndex(
+    os.path.join(app.root_path, "static", "vendor"), max_age=VENDOR_MAX_AGE
+)
+
+
+def send_indexed(index: SiteIndex, path: str) -> Response:
+    """Serve a file from memory with a strong ETag, 304 on a matching If-None-Match.
+
+    The .br/.gz variant written at build time is sent when the client accepts
+    it; each encoding gets its own ETag as it is a different representation.
+    """
+    entry = index.get(path)
+    if entry is None:
+        abort(404)
+
+    encoding = None
+    for candidate in ["br", "gzip"]:
+        if candidate in entry.variants and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+
+    response = Response(entry.variants[encoding], mimetype=entry.mimetype)
+    response.set_etag(entry.etag if encoding is None else f"{entry.etag}-{encoding}")
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    if len(entry.variants) > 1:
+        response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.max_age = index.max_age()
+
+    return response.make_conditional(request)
+
+
+def send_page(filename):
+    return send_indexed(pages, filename)
+
+
+@app.route("/vendor/<path:filename>")
+def vendor(filename):
+    response = send_indexed(vendor_files, filename)
+    response.cache_control.immutable = True
+    return response
+
+
+@app.route("/fig/base/<digest>")
+def figure_base(digest):
+    # Named by content hash, so a page's shared figure base never changes
+    response = send_indexed(pages, f"fig/base/{digest}.json")
+    response.cache_control.max_age = VENDOR_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+@app.route("/fig/<build>/<page>/<symbol>")
+def figure(build, page, symbol):
+    # Pre-generated per-ticker figures for the lazily loaded pages, kept per build
+    return send_indexed(pages, f"fig/{build}/{page}/{symbol}.json")
+
 
 @app.route("/")
 def home():
-    return send_from_directory("static_html", "mag7.html")
+    return send_page("mag7.html")
 
 
 @app.route("/mag7")
 def mag7():
-    return send_from_directory("static_html", "mag7.html")
+    return send_page("mag7.html")
 
 
 @app.route("/ai")
 def ai():
-    return send_from_directory("static_html", "ai.html")
+    return send_page("ai.html")
 
 
 @app.route("/tech")
 def tech():
-    return send_from_directory("static_html", "tech.html")
+    return send_page("tech.html")
 
 
 @app.route("/meme")
 def meme():
-    return send_from_directory("static_html", "meme.html")
+    return send_page("meme.html")
 
 
 @app.route("/watch")
 def watch():
-    return send_from_directory("static_html", "watch.html")
+    return send_page("watch.html")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,72 @@
+"""Price data for the benchmarks: synthetic series of any length, or recorded ones."""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from scripts.data_source import OptionChain, SnapshotTicker
+
+
+def synthetic_history(bars: int, seed: int) -> pd.DataFrame:
+    """Random walk OHLCV business days ending 2024-06-28, the same for a seed."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    open_ = close * (1 + rng.normal(0, 0.005, bars))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, bars)))
+    volume = rng.integers(1e6, 5e6, bars).astype(float)
+    index = pd.bdate_range(
+        end="2024-06-28", periods=bars, tz="America/New_York", name="Date"
+    )
+
+    return pd.DataFrame(
+        {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume},
+        index=index,
+    )
+
+
+def synthetic_snapshot(
+    bars: int, seed: int, history: pd.DataFrame = None
+) -> SnapshotTicker:
+    """Snapshot with weekly option chains around the last close of the history."""
+    if history is None:
+        history = synthetic_history(bars, seed)
+    last_close = history["Close"].iloc[-1]
+    strikes = np.round(last_close * np.linspace(0.8, 1.2, 41), 1)
+
+    options = []
+    chains = {}
+    for week in range(1, 6):
+        expiry = (history.index[-1] + pd.Timedelta(weeks=week)).strftime("%Y-%m-%d")
+        iv = 0.3 + 0.01 * week
+        calls = pd.DataFrame(
+            {
+                "strike": strikes,
+                "inTheMoney": strikes < last_close,
+                "impliedVolatility": iv,
+            }
+        )
+        puts = pd.DataFrame(
+            {
+                "strike": strikes,
+                "inTheMoney": strikes > last_close,
+                "impliedVolatility": iv,
+            }
+        )
+        options.append(expiry)
+        chains[expiry] = OptionChain(calls, puts)
+
+    return SnapshotTicker(history, tuple(options), chains)
+
+
+def recorded_histories(folder: str) -> dict:
+    """OHLCV histories of a PriceStore folder or a recorded (--record) folder."""
+    histories = {}
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".parquet") and not name.endswith(".indicators.parquet"):
+            histories[name[: -len(".parquet")]] = pd.read_parquet(f"{folder}/{name}")
+        elif os.path.exists(f"{folder}/{name}/history.parquet"):
+            histories[name] = pd.read_parquet(f"{folder}/{name}/history.parquet")
+
+    return {symbol: df for symbol, df in histories.items() if not df.empty}
@@ -0,0 +1,61 @@
+"""Per ticker build time of the page figures, plotly validated vs plain dicts.
+
+Runs on synthetic prices and option chains in a temporary folder, so it needs
+no network or price store:
+
+    python -m benchmarks.figure_build --tickers 20 --bars 250
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.data import synthetic_snapshot
+from scripts.data_source import SnapshotTicker
+from scripts.figure_dict import FAST_FIGURES
+from scripts.page_output import encode_figure
+from scripts.stock_plots import PlotInfo
+
+
+def build(symbol: str, snapshot: SnapshotTicker, fast: bool) -> list:
+    """The candle and peak to peak figures of one ticker, encoded as on the page."""
+    plot_info = PlotInfo(snapshot, symbol, f"{len(snapshot.df)}d")
+    candle = plot_info.generate_candle_plot(4, fast=fast)
+    peak2peak = plot_info.generate_peak2peak_plot(fast=fast)
+
+    return [encode_figure(candle), encode_figure(peak2peak)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark page figure building")
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--bars", type=int, default=250)
+    args = parser.parse_args()
+
+    if not FAST_FIGURES:
+        raise SystemExit("plotly's internals used by FigureDict are missing")
+
+    snapshots = {
+        f"SYN{i}": synthetic_snapshot(args.bars, i) for i in range(args.tickers)
+    }
+
+    os.chdir(tempfile.mkdtemp())
+    os.makedirs("past_forecast")
+
+    timings = {}
+    outputs = {}
+    for fast in [False, True]:
+        # One untimed build so caches and imports are warm for both paths
+        build("SYN0", snapshots["SYN0"], fast)
+        start = time.perf_counter()
+        outputs[fast] = [build(s, snapshot, fast) for s, snapshot in snapshots.items()]
+        timings[fast] = (time.perf_counter() - start) / args.tickers
+
+    if outputs[True] != outputs[False]:
+        raise SystemExit("fast figures differ from the plotly built ones")
+
+    print(f"{args.tickers} tickers x {args.bars} bars, identical JSON")
+    print(f"  go.Figure:  {timings[False] * 1000:.1f} ms per ticker")
+    print(f"  FigureDict: {timings[True] * 1000:.1f} ms per ticker")
+    print(f"  speedup:    {timings[False] / timings[True]:.2f}x")
@@ -0,0 +1,311 @@
+"""Timing suite for the indicators, extrema, figure building and encoding.
+
+Every case runs on series of 250, 2,500 and 25,000 bars or on panels of 10 to
+1,000 tickers, built from synthetic prices (reproducible, the default) or from
+the histories of a PriceStore or recorded folder. The median of several runs
+is reported next to the stored baseline of the same case, and the run fails
+when the fastest run of any case got slower than the threshold allows (the
+fastest run is the least disturbed by other load on the machine):
+
+    python -m benchmarks.suite                      # compare with the baseline
+    python -m benchmarks.suite --save               # store a new baseline
+    python -m benchmarks.suite --cases psar extrema --bars 250 2500
+    python -m benchmarks.suite --recorded price_data
+
+The baseline in git is the synthetic data one. Cases are compared as ratios
+to a reference kernel timed in the same run, so a slower or busier machine
+moves both and does not count as a regression. Timings still vary by up to 2x
+between runs, so a case past the threshold is timed again RECHECKS times and
+only fails the run when it stays past it every time.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.signal import argrelmax, argrelmin
+
+from benchmarks.data import recorded_histories, synthetic_history, synthetic_snapshot
+from scripts.indicators import calculate_psar, psar_panel
+from scripts.page_output import encode_figure
+from scripts.preparation import build_feature_matrix, preprocess
+from scripts.stock_analysis import clean_extrema_idx, eval_max_min
+from scripts.stock_plots import PlotInfo
+
+BARS = [250, 2500, 25000]
+TICKERS = [10, 100, 1000]
+PANEL_BARS = 250
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Each case is timed for at least this long, and at least MIN_REPEATS times
+MIN_SECONDS = 1.0
+MIN_REPEATS = 5
+MAX_REPEATS = 50
+
+# Times a case past the threshold is re-run before it counts as a regression
+RECHECKS = 2
+
+# Input of the reference kernel
+REFERENCE_VALUES = 200_000
+
+
+def reference_case() -> tuple:
+    """(setup, run) of a fixed numpy / pandas / Python workload, the unit of time."""
+
+    def setup():
+        return (np.random.default_rng(0).random(REFERENCE_VALUES),)
+
+    def reference(values):
+        np.sort(values)
+        pd.Series(values).rolling(20).mean()
+        total = 0.0
+        for value in values[: REFERENCE_VALUES // 10].tolist():
+            total += value
+        return total
+
+    return setup, reference
+
+
+def series_cases(history: pd.DataFrame) -> dict:
+    """name -> (setup, run) for the single ticker cases of one history."""
+    bars = len(history)
+
+    def extrema_setup():
+        max_idx = argrelmax(history["High"].values, order=4)[0]
+        min_idx = argrelmin(history["Low"].values, order=4)[0]
+        return max_idx, min_idx, history
+
+    def extrema(max_idx, min_idx, stock):
+        clean_max, clean_min = clean_extrema_idx(max_idx, min_idx, stock)
+        eval_max_min(clean_max, clean_min, stock)
+
+    def plot_setup():
+        return (PlotInfo(synthetic_snapshot(bars, 0, history), "BENCH", f"{bars}d"),)
+
+    def candle_plot(plot_info):
+        plot_info.generate_candle_plot(4, fast=True)
+
+    def encode_setup():
+        plot_info = plot_setup()[0]
+        return (plot_info.generate_candle_plot(4, fast=True),)
+
+    return {
+        f"psar[{bars}]": (lambda: (history,), calculate_psar),
+        f"preprocess[{bars}]": (lambda: (history.copy(),), preprocess),
+        f"extrema[{bars}]": (extrema_setup, extrema),
+        f"candle_plot[{bars}]": (plot_setup, candle_plot),
+        f"encode_figure[{bars}]": (encode_setup, encode_figure),
+    }
+
+
+def panel_cases(histories: list) -> dict:
+    """name -> (setup, run) for the cases over all tickers at once."""
+    tickers = len(histories)
+
+    def wide_setup():
+        return tuple(
+            pd.concat([df[col] for df in histories], axis=1, ignore_index=True)
+            for col in ["High", "Low", "Close"]
+        )
+
+    def long_setup():
+        frames = [
+            df[["Open", "High", "Low", "Close", "Volume"]]
+            .rename_axis("Date")
+            .reset_index()
+            .assign(Symbol=f"T{i:04d}")
+            for i, df in enumerate(histories)
+        ]
+        return (pd.concat(frames, ignore_index=True),)
+
+    return {
+        f"psar_panel[{tickers}]": (wide_setup, psar_panel),
+        f"feature_matrix[{tickers}]": (long_setup, build_feature_matrix),
+    }
+
+
+def time_case(setup, run) -> dict:
+    """Median and fastest time of run(*setup()), a fresh setup for every run."""
+    # One untimed run first, so caches and lazy imports are warm
+    run(*setup())
+    seconds = []
+    while len(seconds) < MAX_REPEATS and (
+        len(seconds) < MIN_REPEATS or sum(seconds) < MIN_SECONDS
+    ):
+        args = setup()
+        start = time.perf_counter()
+        run(*args)
+        seconds.append(time.perf_counter() - start)
+
+    return {
+        "median": statistics.median(seconds),
+        "min": min(seconds),
+        "repeats": len(seconds),
+    }
+
+
+def series_histories(bars_list: list, recorded: dict = None) -> list:
+    """One history per length: synthetic, or the longest recorded one cut to it."""
+    if not recorded:
+        return [synthetic_history(bars, 0) for bars in bars_list]
+
+    longest = max(recorded.values(), key=len)
+    histories = []
+    for bars in bars_list:
+        if len(longest) < bars:
+            print(f"Skipping {bars} bars: the longest recorded history is shorter")
+            continue
+        histories.append(longest.iloc[-bars:])
+    return histories
+
+
+def panel_histories(tickers: int, recorded: dict = None) -> list:
+    """tickers histories of PANEL_BARS bars, recorded ones reused round robin."""
+    if not recorded:
+        return [synthetic_history(PANEL_BARS, seed) for seed in range(tickers)]
+
+    frames = [df.iloc[-PANEL_BARS:] for df in recorded.values()]
+    return [frames[i % len(frames)] for i in range(tickers)]
+
+
+def machine() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Print every case against its baseline, return the ones past the threshold.
+
+    The change is the case's fastest run in reference units over the baseline's.
+    """
+    regressions = []
+    print(f"{'case':<28} {'median':>10} {'baseline':>10} {'change':>10}")
+    for name, result in results.items():
+        base = baseline.get("cases", {}).get(name)
+        line = f"{name:<28} {result['median'] * 1000:8.2f}ms"
+        if base:
+            ratio = result["relative"] / base["relative"]
+            line += f" {base['median'] * 1000:8.2f}ms {ratio:9.2f}x"
+            if ratio > 1 + threshold:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+
+    return regressions
+
+
+def recheck(regressions: list, cases: dict, baseline: dict, threshold: float) -> list:
+    """The regressions still past the threshold in each of RECHECKS new timings."""
+    confirmed = []
+    for name in regressions:
+        base = baseline["cases"][name]
+        ratios = []
+        for _ in range(RECHECKS):
+            reference_min = time_case(*reference_case())["min"]
+            ratio = time_case(*cases[name])["min"] / reference_min / base["relative"]
+            ratios.append(ratio)
+            if ratio <= 1 + threshold:
+                break
+        print(f"{name:<28} timed again: {', '.join(f'{r:.2f}x' for r in ratios)}")
+        if all(ratio > 1 + threshold for ratio in ratios):
+            confirmed.append(name)
+
+    return confirmed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark suite with baselines")
+    parser.add_argument("--cases", nargs="*", help="Run the cases with these prefixes")
+    parser.add_argument("--bars", type=int, nargs="*", default=BARS)
+    parser.add_argument("--tickers", type=int, nargs="*", default=TICKERS)
+    parser.add_argument(
+        "--recorded", help="PriceStore or recorded folder to take the prices from"
+    )
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.5,
+        help="Allowed slow down over the baseline, in reference units (0.5: 50%%)",
+    )
+    parser.add_argument("--save", action="store_true", help="Store as the baseline")
+    args = parser.parse_args()
+
+    baseline_path = os.path.abspath(args.baseline)
+    recorded = recorded_histories(args.recorded) if args.recorded else None
+    data = f"recorded:{os.path.basename(args.recorded)}" if recorded else "synthetic"
+
+    cases = {}
+    for history in series_histories(args.bars, recorded):
+        cases.update(series_cases(history))
+    for tickers in args.tickers:
+        cases.update(panel_cases(panel_histories(tickers, recorded)))
+    if args.cases:
+        cases = {
+            name: case
+            for name, case in cases.items()
+            if name.startswith(tuple(args.cases))
+        }
+
+    # PlotInfo writes the option forecasts into past_forecast/
+    os.chdir(tempfile.mkdtemp())
+    os.makedirs("past_forecast")
+
+    # The reference is timed before and after the cases, the faster one counts
+    reference = time_case(*reference_case())
+    results = {}
+    for name, (setup, run) in cases.items():
+        results[name] = time_case(setup, run)
+    reference_min = min(reference["min"], time_case(*reference_case())["min"])
+    for result in results.values():
+        result["relative"] = result["min"] / reference_min
+    print(f"Reference kernel: {reference_min * 1000:.2f}ms")
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, "r") as f:
+            baseline = json.load(f)
+    if baseline and baseline.get("data") != data:
+        print(f"Baseline was taken on {baseline.get('data')} data, this run: {data}")
+        baseline = {}
+    if baseline and "relative" not in next(iter(baseline["cases"].values()), {}):
+        print("Baseline has no reference timings, store a new one with --save")
+        baseline = {}
+    if baseline and baseline.get("machine") != machine():
+        print("Baseline was taken on another machine or library versions")
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions and not args.save:
+        regressions = recheck(regressions, cases, baseline, args.threshold)
+
+    # Without a baseline (e.g. a --baseline of its own) the first run becomes one
+    if args.save or not os.path.exists(baseline_path):
+        # Keep the baseline of cases not run this time
+        cases = {**baseline.get("cases", {}), **results} if baseline else results
+        with open(baseline_path, "w") as f:
+            json.dump(
+                {"data": data, "machine": machine(), "cases": cases},
+                f,
+                indent=1,
+                sort_keys=True,
+            )
+        print(f"Baseline saved to {baseline_path}")
+    elif regressions:
+        print(
+            f"{len(regressions)} case(s) slower than the baseline by over "
+            f"{args.threshold:.0%} in every timing: {', '.join(regressions)}"
+        )
+        sys.exit(1)
@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+from scipy.signal import argrelmax, argrelmin
+
+from scripts.indicators import psar_panel
+from scripts.stock_analysis import get_macd_signals
+
+SIGNALS = ["bull_idx", "macd_up_idx", "macd_down_idx"]
+
+# Price move each signal is expected to call: up for the bullish ones
+SIGNAL_DIRECTION = {"bull_idx": 1, "macd_up_idx": 1, "macd_down_idx": -1}
+
+
+def indicator_panel(
+    high: pd.DataFrame,
+    low: pd.DataFrame,
+    close: pd.DataFrame,
+    af_step: float = 0.02,
+    af_max: float = 0.2,
+) -> dict:
+    """The PlotInfo columns the MACD signals need, for aligned (dates x tickers) panels."""
+    ema = {span: close.ewm(span=span).mean() for span in [5, 12, 20, 26, 60]}
+    macd = (ema[12] - ema[26]) / ema[26]
+    psar = psar_panel(high, low, close, af_step, af_max)[0]
+
+    return {
+        "5ema": ema[5],
+        "20ema": ema[20],
+        "60ema": ema[60],
+        "macd_hist": macd - macd.ewm(span=9).mean(),
+        "psar_diff": (close - psar) / close,
+    }
+
+
+def panel_signals(indicators: dict) -> dict:
+    """bull_idx / macd_up_idx / macd_down_idx as (dates x tickers) bool arrays."""
+    signals = get_macd_signals(
+        indicators["macd_hist"],
+        indicators["5ema"],
+        indicators["20ema"],
+        indicators["60ema"],
+        indicators["psar_diff"],
+    )
+
+    return {name: np.asarray(signals[name], dtype=bool) for name in SIGNALS}
+
+
+def extrema_signals(high, low, order: int = 4) -> dict:
+    """Raw troughs / peaks of get_extrema_for_plot, flagged on the bar they are confirmed.
+
+    argrelmin needs order bars after a trough, so the signal fires order bars
+    later; that keeps the backtest free of look-ahead.
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    signals = {}
+    for name, values, find in [("trough", low, argrelmin), ("peak", high, argrelmax)]:
+        rows, cols = find(values, axis=0, order=order)
+        rows = rows + order
+        fired = np.zeros(values.shape, dtype=bool)
+        fired[rows[rows < len(values)], cols[rows < len(values)]] = True
+        signals[name] = fired
+
+    return signals
+
+
+def positions(entries, exits=None, hold: int = None) -> np.ndarray:
+    """Long (1) / flat (0) position after each bar's close.
+
+    With exits the position is held from an entry until the next exit (an exit
+    on the same bar wins). With hold it lasts hold bars after the latest entry.
+    """
+    entries = np.asarray(entries, dtype=bool)
+    if hold is not None:
+        if hold < 1:
+            raise ValueError(f"hold must be at least one bar, got {hold}")
+        count = np.cumsum(entries, axis=0)
+        before = np.zeros_like(count)
+        before[hold:] = count[:-hold]
+        return (count > before).astype(np.float64)
+
+    exits = np.asarray(exits, dtype=bool)
+    state = np.where(exits, 0.0, np.where(entries, 1.0, np.nan))
+
+    # Forward fill the last entry/exit down each column
+    rows = np.arange(len(state))[:, None]
+    last = np.maximum.accumulate(np.where(np.isnan(state), 0, rows), axis=0)
+    filled = np.take_along_axis(state, last, axis=0)
+
+    return np.nan_to_num(filled, nan=0.0)
+
+
+def backtest(close, position, cost: float = 0.0) -> dict:
+    """Simulate long-only trades on (dates x runs) arrays in one vectorized pass.
+
+    position comes from positions(). Signals are known at the close, so a
+    position earns from the next bar on; cost is charged per unit of position
+    change. Columns can be tickers, or ticker/rule pairs side by side (run_grid).
+    """
+    prices = np.asarray(close, dtype=np.float64)
+    position = np.asarray(position, dtype=np.float64)
+
+    held = np.zeros_like(position)
+    held[1:] = position[:-1]
+    bar_return = np.zeros_like(prices)
+    bar_return[1:] = prices[1:] / prices[:-1] - 1
+    bar_return = np.nan_to_num(bar_return, nan=0.0, posinf=0.0, neginf=0.0)
+
+    turnover = np.abs(np.diff(held, axis=0, prepend=0))
+    returns = held * bar_return - cost * turnover
+    equity = np.cumprod(1 + returns, axis=0)
+    drawdown = equity / np.maximum.accumulate(equity, axis=0) - 1
+
+    # Per trade returns: number the trades in each column and sum log returns
+    starts = np.diff(held, axis=0, prepend=0) > 0
+    trade_id = np.cumsum(starts, axis=0)
+    n_trades = trade_id[-1] if len(trade_id) else np.zeros(held.shape[1], int)
+    offset = np.concatenate(([0], np.cumsum(n_trades)[:-1]))
+    in_trade = held > 0
+    flat_id = (trade_id - 1 + offset)[in_trade]
+    trade_log = np.bincount(
+        flat_id,
+        weights=np.log1p(returns[in_trade]),
+        minlength=n_trades.sum(),
+    )
+    trade_col = np.repeat(np.arange(held.shape[1]), n_trades)
+    wins = np.bincount(trade_col, weights=trade_log > 0, minlength=held.shape[1])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = returns.std(axis=0)
+        stats = pd.DataFrame(
+            {
+                "total_return": equity[-1] - 1,
+                "max_drawdown": drawdown.min(axis=0),
+                "exposure": held.mean(axis=0),
+                "n_trades": n_trades,
+                "win_rate": wins / n_trades,
+                "sharpe": np.where(
+                    std > 0, returns.mean(axis=0) / std * np.sqrt(252), np.nan
+                ),
+            },
+            index=close.columns if isinstance(close, pd.DataFrame) else None,
+        )
+
+    return {
+        "position": held,
+        "returns": returns,
+        "equity": equity,
+        "drawdown": drawdown,
+        "stats": stats,
+    }
+
+
+def signal_hit_rates(close, signals: dict, horizons=(1, 5, 10)) -> pd.DataFrame:
+    """How often each signal called the move over the next horizon bars, and the mean move."""
+    prices = np.asarray(close, dtype=np.float64)
+    rows = []
+    for horizon in horizons:
+        forward = np.full_like(prices, np.nan)
+        forward[:-horizon] = prices[horizon:] / prices[:-horizon] - 1
+        for name, fired in signals.items():
+            moves = forward[np.asarray(fired, dtype=bool) & ~np.isnan(forward)]
+            direction = SIGNAL_DIRECTION.get(name, 1)
+            rows.append(
+                {
+                    "signal": name,
+                    "horizon": horizon,
+                    "count": len(moves),
+                    "hit_rate": (
+                        (moves * direction > 0).mean() if len(moves) else np.nan
+                    ),
+                    "mean_return": moves.mean() if len(moves) else np.nan,
+                }
+            )
+
+    return pd.DataFrame(rows).set_index(["signal", "horizon"])
+
+
+def run_grid(close: pd.DataFrame, signals: dict, rules: list, cost=0.0) -> dict:
+    """Backtest every rule on every ticker in a single pass.
+
+    A rule is a dict like {"entry": "bull_idx", "exit": "macd_down_idx"} or
+    {"entry": "macd_up_idx", "hold": 10}. The runs are laid side by side as
+    extra columns and the stats are indexed by (rule, ticker).
+    """
+    position = np.hstack(
+        [
+            positions(
+                signals[rule["entry"]],
+                signals[rule["exit"]] if rule.get("exit") else None,
+                rule.get("hold"),
+            )
+            for rule in rules
+        ]
+    )
+    prices = np.tile(np.asarray(close, dtype=np.float64), len(rules))
+
+    result = backtest(prices, position, cost)
+    result["stats"].index = pd.MultiIndex.from_product(
+        [range(len(rules)), close.columns], names=["rule", "ticker"]
+    )
+
+    return result
@@ -0,0 +1,309 @@
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from functools import partial
+
+import pandas as pd
+import yfinance as yf
+
+from scripts import profiling
+from scripts.price_store import trailing_window
+
+OptionChain = namedtuple("OptionChain", ["calls", "puts"])
+
+
+class DataSource:
+    """Hands out ticker-like objects (history, options, option_chain, get_dividends).
+
+    Every request goes through ``timed`` so download latency can be reported
+    separately from the compute that follows it.
+    """
+
+    def __init__(
+        self,
+        max_per_second: float = None,
+        chain_ttl: float = 600,
+        chain_folder: str = None,
+    ):
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+        self.limiter = RateLimiter(max_per_second) if max_per_second else None
+        self.chain_cache = OptionChainCache(chain_ttl, chain_folder)
+
+    def ticker(self, symbol: str):
+        raise NotImplementedError
+
+    def tickers(self, symbols: list) -> dict:
+        return {symbol: self.ticker(symbol) for symbol in symbols}
+
+    def timed(self, kind: str, func, *args, symbol: str = None, **kwargs):
+        if self.limiter is not None:
+            self.limiter.wait()
+
+        start = time.perf_counter()
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.stats_lock:
+                stat = self.stats.setdefault(kind, {"calls": 0, "seconds": 0.0})
+                stat["calls"] += 1
+                stat["seconds"] += elapsed
+            profiling.network(kind, symbol, elapsed, result)
+
+    def report(self) -> str:
+        lines = [f"{type(self).__name__} requests:"]
+        for kind, stat in sorted(self.stats.items()):
+            lines.append(f"  {kind}: {stat['calls']} calls, {stat['seconds']:.2f}s")
+        lines.append(
+            f"  option_chain cache: {self.chain_cache.hits} hits, "
+            f"{self.chain_cache.misses} misses"
+        )
+        return "\n".join(lines)
+
+
+class OptionChainCache:
+    """Option chains keyed by (symbol, expiry), kept for ``ttl`` seconds.
+
+    With a folder the chains are also saved as Parquet files, so a re-run
+    within the TTL (a retried or a second build) reuses them instead of
+    downloading them again.
+    """
+
+    def __init__(self, ttl: float = 600, folder: str = None):
+        self.ttl = ttl
+        self.folder = folder
+        self.chains = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, symbol: str, date: str, side: str) -> str:
+        return f"{self.folder}/{symbol}/{date}_{side}.parquet"
+
+    def get(self, symbol: str, date: str, fetch) -> OptionChain:
+        key = (symbol, date)
+        with self.lock:
+            cached = self.chains.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.ttl:
+                self.hits += 1
+                return cached[1]
+
+        chain = self.load(symbol, date)
+        hit = chain is not None
+        if not hit:
+            chain = fetch(date)
+            self.save(symbol, date, chain)
+
+        with self.lock:
+            self.hits += hit
+            self.misses += not hit
+            self.chains[key] = (time.monotonic(), chain)
+
+        return chain
+
+    def load(self, symbol: str, date: str) -> OptionChain:
+        """The saved chain when it is younger than the TTL, else None."""
+        if self.folder is None:
+            return None
+        paths = [self.path(symbol, date, side) for side in OptionChain._fields]
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        if time.time() - min(os.path.getmtime(path) for path in paths) >= self.ttl:
+            return None
+        return OptionChain(*(pd.read_parquet(path) for path in paths))
+
+    def save(self, symbol: str, date: str, chain: OptionChain):
+        if self.folder is None:
+            return
+        os.makedirs(f"{self.folder}/{symbol}", exist_ok=True)
+        for side, df in zip(OptionChain._fields, chain):
+            path = self.path(symbol, date, side)
+            df.to_parquet(f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+
+
+class RateLimiter:
+    """Spaces out requests to one host across all threads."""
+
+    def __init__(self, max_per_second: float):
+        self.interval = 1 / max_per_second
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SourceTicker:
+    """Ticker proxy that routes every call through its source."""
+
+    def __init__(self, source: DataSource, symbol: str, backend):
+        self.source = source
+        self.symbol = symbol
+        self.backend = backend
+
+    def timed(self, kind: str, func, *args, **kwargs):
+        return self.source.timed(
+            kind, partial(func, *args, **kwargs), symbol=self.symbol
+        )
+
+    def history(self, **kwargs) -> pd.DataFrame:
+        return self.timed("history", self.backend.history, **kwargs)
+
+    @property
+    def options(self) -> tuple:
+        return self.timed("options", lambda: tuple(self.backend.options))
+
+    def option_chain(self, date: str) -> OptionChain:
+        return self.source.chain_cache.get(self.symbol, date, self.fetch_chain)
+
+    def fetch_chain(self, date: str) -> OptionChain:
+        chain = self.timed("option_chain", self.backend.option_chain, date)
+        return OptionChain(chain.calls, chain.puts)
+
+    def get_dividends(self) -> pd.Series:
+        return self.timed("dividends", self.backend.get_dividends)
+
+
+class YFinanceSource(DataSource):
+    """Live data straight from yfinance."""
+
+    def ticker(self, symbol: str) -> SourceTicker:
+        return SourceTicker(self, symbol, yf.Ticker(symbol))
+
+
+class RecordingSource(DataSource):
+    """Live yfinance data, saving every response so it can be replayed later.
+
+    Chains are cached in memory only, every one has to reach the recording.
+    """
+
+    def __init__(self, folder: str, max_per_second: float = None, chain_ttl=600):
+        super().__init__(max_per_second, chain_ttl)
+        self.folder = folder
+
+    def ticker(self, symbol: str) -> SourceTicker:
+        return SourceTicker(self, symbol, RecordingTicker(symbol, self.folder))
+
+
+class ReplaySource(DataSource):
+    """Serves previously recorded history and option chains, no network needed."""
+
+    def __init__(self, folder: str):
+        super().__init__()
+        self.folder = folder
+
+    def ticker(self, symbol: str) -> SourceTicker:
+        return SourceTicker(self, symbol, ReplayTicker(symbol, self.folder))
+
+
+class ReplayTicker:
+    def __init__(self, symbol: str, folder: str):
+        self.symbol = symbol
+        self.folder = f"{folder}/{symbol}"
+
+    def chain_path(self, date: str, side: str) -> str:
+        return f"{self.folder}/chain_{date}_{side}.parquet"
+
+    def history(self, period: str = None, start: str = None, **kwargs) -> pd.DataFrame:
+        path = f"{self.folder}/history.parquet"
+        if not os.path.exists(path):
+            return pd.DataFrame()
+
+        df = pd.read_parquet(path)
+        if start is not None:
+            return df[df.index >= pd.Timestamp(start, tz=df.index.tz)]
+        if period is not None:
+            return trailing_window(df, period)
+        return df
+
+    @property
+    def options(self) -> tuple:
+        path = f"{self.folder}/options.json"
+        if not os.path.exists(path):
+            return ()
+        with open(path, "r") as f:
+            return tuple(json.load(f))
+
+    def option_chain(self, date: str) -> OptionChain:
+        return OptionChain(
+            pd.read_parquet(self.chain_path(date, "calls")),
+            pd.read_parquet(self.chain_path(date, "puts")),
+        )
+
+    def get_dividends(self) -> pd.Series:
+        path = f"{self.folder}/dividends.parquet"
+        if not os.path.exists(path):
+            return pd.Series(dtype=float, name="Dividends")
+        return pd.read_parquet(path)["Dividends"]
+
+
+class SnapshotTicker:
+    """In-memory ticker holding one prefetched history window and its option chains.
+
+    It is cheap to pickle, so figure building can run in another process.
+    extrema optionally carries the symbol's ExtremaState from the price store.
+    """
+
+    def __init__(
+        self, history: pd.DataFrame, options: tuple, chains: dict, extrema=None
+    ):
+        self.df = history
+        self.options = options
+        self.chains = chains
+        self.extrema = extrema
+
+    def history(self, **kwargs) -> pd.DataFrame:
+        return self.df.copy()
+
+    def option_chain(self, date: str) -> OptionChain:
+        return self.chains[date]
+
+
+class RecordingTicker(ReplayTicker):
+    def __init__(self, symbol: str, folder: str):
+        super().__init__(symbol, folder)
+        self.live = yf.Ticker(symbol)
+        os.makedirs(self.folder, exist_ok=True)
+
+    def history(self, **kwargs) -> pd.DataFrame:
+        df = self.live.history(**kwargs)
+
+        # Merge into what was recorded before so replays can serve any window
+        recorded = super().history(period="max")
+        if not recorded.empty:
+            merged = pd.concat([recorded, df])
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+        else:
+            merged = df
+        merged.to_parquet(f"{self.folder}/history.parquet")
+
+        return df
+
+    @property
+    def options(self) -> tuple:
+        options = tuple(self.live.options)
+        with open(f"{self.folder}/options.json", "w") as f:
+            json.dump(list(options), f)
+        return options
+
+    def option_chain(self, date: str) -> OptionChain:
+        chain = self.live.option_chain(date)
+        chain.calls.to_parquet(self.chain_path(date, "calls"))
+        chain.puts.to_parquet(self.chain_path(date, "puts"))
+        return OptionChain(chain.calls, chain.puts)
+
+    def get_dividends(self) -> pd.Series:
+        dividends = self.live.get_dividends()
+        dividends.to_frame("Dividends").to_parquet(f"{self.folder}/dividends.parquet")
+        return dividends
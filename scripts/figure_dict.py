@@ -0,0 +1,119 @@
+try:
+    # Private plotly helpers, checked against the version pinned in
+    # requirements.txt (benchmarks/figure_build.py compares the JSON)
+    from _plotly_utils.basevalidators import (
+        copy_to_readonly_numpy_array,
+        is_homogeneous_array,
+        to_scalar_or_list,
+    )
+    from _plotly_utils.utils import convert_to_base64
+except ImportError:
+    # Figures are then built through the validated go.Figure path
+    FAST_FIGURES = False
+else:
+    FAST_FIGURES = True
+
+# Free form values plotly stores exactly as given (e.g. relayout button args)
+FREE_FORM = ["args"]
+
+# Prefixes of the magic underscore names used by the page figures
+MAGIC_PREFIXES = ["marker", "line", "xaxis", "yaxis", "title", "legend"]
+
+
+class FigureDict:
+    """Figure kept as the plain dicts plotly would produce, without the validators.
+
+    It starts from a layout made by plotly once (see stock_plots.candle_layout)
+    and supports the few go.Figure calls the page figures need: add_trace with
+    trace dicts and update_layout on keys the layout already has. The result of
+    to_plotly_json() is the same as for the equivalent go.Figure.
+    """
+
+    def __init__(self, layout: dict):
+        self.data = []
+        self.layout = copy_tree(layout)
+
+    def add_trace(self, trace: dict, row: int = None, col: int = None):
+        trace = plotly_order(coerce(expand(trace)))
+        trace["type"] = trace.pop("type")
+        if row is not None:
+            trace["xaxis"] = "x" if row == 1 else f"x{row}"
+            trace["yaxis"] = "y" if row == 1 else f"y{row}"
+        self.data.append(trace)
+
+        return self
+
+    def update_layout(self, dict1: dict = None, **kwargs):
+        update = expand({**(dict1 or {}), **kwargs})
+        if isinstance(update.get("title"), str):
+            update["title"] = {"text": update["title"]}
+        merge(self.layout, plotly_order(update))
+
+        return self
+
+    def to_plotly_json(self) -> dict:
+        fig_dict = {"data": copy_tree(self.data), "layout": copy_tree(self.layout)}
+        convert_to_base64(fig_dict)
+
+        return fig_dict
+
+
+def expand(props: dict) -> dict:
+    """Turn plotly's magic underscores (marker_color=...) into nested dicts."""
+    expanded = {}
+    for key, value in props.items():
+        *parents, leaf = key.split("_")
+        if parents and parents[0] in MAGIC_PREFIXES:
+            target = expanded
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[leaf] = value
+        else:
+            expanded[key] = value
+
+    return expanded
+
+
+def coerce(value):
+    """Arrays the way plotly's validators store them: read-only numpy or lists."""
+    if isinstance(value, dict):
+        return {key: coerce(item) for key, item in value.items()}
+    if is_homogeneous_array(value):
+        return copy_to_readonly_numpy_array(value)
+    if isinstance(value, (list, tuple)):
+        if value and isinstance(value[0], dict):
+            return [coerce(item) for item in value]
+        return to_scalar_or_list(value)
+    return value
+
+
+def plotly_order(value):
+    # plotly sets object properties in alphabetical order
+    if isinstance(value, dict):
+        return {
+            key: value[key] if key in FREE_FORM else plotly_order(value[key])
+            for key in sorted(value)
+        }
+    if isinstance(value, list):
+        return [plotly_order(item) for item in value]
+    return value
+
+
+def merge(target: dict, update: dict):
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge(target[key], value)
+        else:
+            target[key] = value
+
+
+def copy_tree(value):
+    """Copy the dicts and lists of a figure, the arrays in it are shared."""
+    if isinstance(value, dict):
+        return {
+            key: item if key == "template" else copy_tree(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [copy_tree(item) for item in value]
+    return value
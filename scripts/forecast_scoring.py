@@ -0,0 +1,266 @@
+import argparse
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from scripts.figure_dict import FAST_FIGURES, FigureDict
+from scripts.forecast_store import ForecastStore
+from scripts.price_store import PriceStore
+
+# One row per scored forecast step, next to the forecasts table. close is the
+# realized close in the prices of the forecast date, band the cone's half width
+# and move the realized distance from its centre, both as a share of the centre
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS forecast_scores (
+    symbol TEXT NOT NULL,
+    forecast_date TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    close REAL,
+    covered INTEGER,
+    band REAL,
+    move REAL,
+    PRIMARY KEY (symbol, forecast_date, step)
+);
+"""
+
+# Share of closes a one standard deviation cone should hold
+EXPECTED_COVERAGE = 0.683
+
+# An expiry on a market holiday is scored with the last close up to this many
+# days before it
+MAX_GAP_DAYS = 4
+
+
+def realized_closes(histories: dict) -> pd.DataFrame:
+    """(symbol, day, close) rows of OHLCV histories, days without time zone."""
+    frames = []
+    for symbol, df in histories.items():
+        if df.empty:
+            continue
+        index = df.index
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "symbol": symbol,
+                    "day": index.normalize().astype("datetime64[ns]"),
+                    "close": df["Close"].to_numpy(dtype=np.float64),
+                }
+            )
+        )
+
+    if not frames:
+        return pd.DataFrame(
+            {
+                "symbol": pd.Series(dtype=object),
+                "day": pd.Series(dtype="datetime64[ns]"),
+                "close": pd.Series(dtype=np.float64),
+            }
+        )
+    return pd.concat(frames, ignore_index=True)
+
+
+def pending_forecasts(store: ForecastStore, symbols: list, until: str) -> pd.DataFrame:
+    """Forecast steps up to until that have no score yet, with their cone's centre."""
+    with store.connect() as conn:
+        conn.executescript(SCHEMA)
+        return pd.read_sql_query(
+            "SELECT f.symbol, f.forecast_date, f.step, f.date, f.upper, f.lower, "
+            "c.upper AS centre FROM forecasts f "
+            "JOIN forecasts c ON c.symbol = f.symbol "
+            "AND c.forecast_date = f.forecast_date AND c.step = 0 "
+            "LEFT JOIN forecast_scores s ON s.symbol = f.symbol "
+            "AND s.forecast_date = f.forecast_date AND s.step = f.step "
+            "WHERE f.step > 0 AND s.symbol IS NULL AND f.date <= ? "
+            f"AND f.symbol IN ({', '.join('?' * len(symbols))})",
+            conn,
+            params=[until, *symbols],
+        )
+
+
+def close_on(frame: pd.DataFrame, column: str, closes: pd.DataFrame) -> pd.DataFrame:
+    """frame sorted by the dates in column, with the close of each row's symbol on
+    that date (or the last one up to MAX_GAP_DAYS before it) as close_<column>."""
+    frame = frame.assign(day=pd.to_datetime(frame[column]).astype(closes["day"].dtype))
+    merged = pd.merge_asof(
+        frame.sort_values("day", kind="stable"),
+        closes.rename(columns={"close": f"close_{column}"}),
+        on="day",
+        by="symbol",
+        direction="backward",
+        tolerance=pd.Timedelta(days=MAX_GAP_DAYS),
+    )
+    return merged.drop(columns="day")
+
+
+def score(pending: pd.DataFrame, closes: pd.DataFrame) -> pd.DataFrame:
+    """Match every pending forecast step with the realized close of its date.
+
+    Histories are split and dividend adjusted, so the realized close is taken
+    in the forecast's prices: its centre times the change of the close since
+    the forecast date. Steps dated after the symbol's last bar, or without
+    closes on both dates, are left out (still pending).
+    """
+    closes = closes.sort_values("day", kind="stable")
+    merged = close_on(close_on(pending, "forecast_date", closes), "date", closes)
+    last_day = merged["symbol"].map(closes.groupby("symbol")["day"].max())
+    merged = merged[
+        merged["close_forecast_date"].notna()
+        & merged["close_date"].notna()
+        & (pd.to_datetime(merged["date"]).to_numpy() <= last_day.to_numpy())
+    ]
+
+    upper = merged["upper"].to_numpy()
+    lower = merged["lower"].to_numpy()
+    centre = merged["centre"].to_numpy()
+    change = merged["close_date"].to_numpy() / merged["close_forecast_date"].to_numpy()
+    close = centre * change
+
+    return pd.DataFrame(
+        {
+            "symbol": merged["symbol"].to_numpy(),
+            "forecast_date": merged["forecast_date"].to_numpy(),
+            "step": merged["step"].to_numpy(),
+            "date": merged["date"].to_numpy(),
+            "close": close,
+            "covered": ((lower <= close) & (close <= upper)).astype(int),
+            "band": (upper - lower) / 2 / centre,
+            "move": np.abs(change - 1),
+        }
+    )
+
+
+def update(store: ForecastStore, histories: dict) -> int:
+    """Score the forecasts whose dates the histories now reach, return how many.
+
+    Already scored steps are skipped, so each run only joins the forecasts
+    that expired since the last one.
+    """
+    closes = realized_closes(histories)
+    if closes.empty:
+        return 0
+
+    until = closes["day"].max().strftime("%Y-%m-%d")
+    pending = pending_forecasts(store, sorted(closes["symbol"].unique()), until)
+    if pending.empty:
+        return 0
+
+    scored = score(pending, closes)
+    with store.connect() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO forecast_scores VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            scored.itertuples(index=False, name=None),
+        )
+
+    return len(scored)
+
+
+def summary(store: ForecastStore, symbols: list = None) -> pd.DataFrame:
+    """Coverage and band error per symbol and horizon (step), from the scores table.
+
+    band_error is the mean distance between the predicted half width and the
+    realized move; with symbols=None the rows are per horizon over all symbols.
+    """
+    group = "step" if symbols is None else "symbol, step"
+    where = ""
+    params = []
+    if symbols is not None:
+        where = f"WHERE symbol IN ({', '.join('?' * len(symbols))}) "
+        params = list(symbols)
+
+    with store.connect() as conn:
+        conn.executescript(SCHEMA)
+        return pd.read_sql_query(
+            f"SELECT {group}, COUNT(*) AS n, AVG(covered) AS coverage, "
+            "AVG(band) AS band, AVG(move) AS move, "
+            "AVG(ABS(band - move)) AS band_error "
+            f"FROM forecast_scores {where}GROUP BY {group} ORDER BY {group}",
+            conn,
+            params=params,
+        )
+
+
+def style_score_figure(fig):
+    fig.update_layout(
+        title=dict(text="IV forecast coverage", font=dict(size=10)),
+        xaxis=dict(title="expiry", dtick=1),
+        yaxis=dict(title="% of closes in cone", range=[0, 100]),
+        margin=dict(l=10, r=10, t=40, b=10),
+        showlegend=False,
+    )
+
+
+@lru_cache(maxsize=None)
+def score_layout() -> dict:
+    fig = go.Figure()
+    style_score_figure(fig)
+
+    return fig.to_plotly_json()["layout"]
+
+
+def score_figure(scores: pd.DataFrame, fast=False):
+    """Small chart of a symbol's summary rows: coverage per expiry vs the expected."""
+    fast = fast and FAST_FIGURES
+    fig = FigureDict(score_layout()) if fast else go.Figure()
+    if not fast:
+        style_score_figure(fig)
+
+    if scores.empty:
+        fig.update_layout(
+            title={"text": "IV forecast coverage: no expired forecasts yet"}
+        )
+        return fig
+
+    steps = scores["step"].to_numpy()
+    fig.add_trace(
+        dict(
+            type="bar",
+            x=steps,
+            y=np.round(100 * scores["coverage"].to_numpy(), 1),
+            hovertext=[
+                f"n={n}, band {band:.1%}, move {move:.1%}"
+                for n, band, move in zip(scores["n"], scores["band"], scores["move"])
+            ],
+            marker=dict(color="rgba(100, 149, 237, 0.8)"),
+            name="coverage",
+        )
+    )
+    fig.add_trace(
+        dict(
+            type="scatter",
+            x=[steps[0] - 0.5, steps[-1] + 0.5],
+            y=[round(100 * EXPECTED_COVERAGE, 1)] * 2,
+            mode="lines",
+            line=dict(color="grey", dash="dash", width=1),
+            name="expected",
+        )
+    )
+
+    band_error = np.average(scores["band_error"], weights=scores["n"])
+    fig.update_layout(
+        title={
+            "text": f"IV forecast coverage ({scores['n'].sum()} closes, "
+            f"band error {band_error:.1%})"
+        }
+    )
+
+    return fig
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score the stored IV forecasts")
+    parser.add_argument("symbols", nargs="*", help="default: every stored symbol")
+    parser.add_argument("--store", default="price_data", help="PriceStore folder")
+    parser.add_argument("--db", default="past_forecast/forecasts.db")
+    args = parser.parse_args()
+
+    price_store = PriceStore(args.store)
+    symbols = args.symbols or price_store.symbols()
+    forecast_store = ForecastStore(args.db)
+    histories = {symbol: price_store.load(symbol) for symbol in symbols}
+    print(f"Scored {update(forecast_store, histories)} new forecast steps")
+    print(summary(forecast_store).to_string(index=False))
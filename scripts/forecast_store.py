@@ -0,0 +1,132 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS forecasts (
+    symbol TEXT NOT NULL,
+    forecast_date TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    upper REAL,
+    lower REAL,
+    PRIMARY KEY (symbol, forecast_date, step)
+);
+CREATE INDEX IF NOT EXISTS forecasts_by_date ON forecasts (forecast_date);
+"""
+
+
+class ForecastStore:
+    """All IV forecast cones in one SQLite table keyed by (symbol, forecast_date, step).
+
+    Step 0 is the strike on the forecast date itself and step n is the n-th
+    expiry, matching the "date"/"upper"/"lower" lists of the old JSON files.
+    Only the path is kept on the object, so it can be handed to worker processes.
+    """
+
+    def __init__(self, path: str = "past_forecast/forecasts.db", retention_days=365):
+        self.path = path
+        self.retention_days = retention_days
+
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+            empty = conn.execute("SELECT 1 FROM forecasts LIMIT 1").fetchone() is None
+
+        # First use: pull in the per-symbol JSON files that used to hold forecasts
+        if empty:
+            self.import_json_folder(os.path.dirname(path) or ".")
+
+    @contextmanager
+    def connect(self):
+        """One transaction: committed (or rolled back on error), then closed."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(
+        self, symbol: str, forecast_date: str, date: list, upper: list, lower: list
+    ):
+        rows = [
+            (symbol, forecast_date, step, d, u, l)
+            for step, (d, u, l) in enumerate(zip(date, upper, lower))
+        ]
+        with self.connect() as conn:
+            # A rerun of the day may have fewer expiries, drop the old steps first
+            conn.execute(
+                "DELETE FROM forecasts WHERE symbol = ? AND forecast_date = ?",
+                (symbol, forecast_date),
+            )
+            conn.executemany("INSERT INTO forecasts VALUES (?, ?, ?, ?, ?, ?)", rows)
+            if self.retention_days is not None:
+                conn.execute(
+                    "DELETE FROM forecasts WHERE symbol = ? AND forecast_date < "
+                    "date((SELECT max(forecast_date) FROM forecasts WHERE symbol = ?), ?)",
+                    (symbol, symbol, f"-{self.retention_days} days"),
+                )
+
+    def recent(self, symbol: str, last: int = 5) -> dict:
+        """Latest forecasts of a symbol, oldest first, in the old JSON layout."""
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT forecast_date, date, upper, lower FROM forecasts "
+                "WHERE symbol = ? AND forecast_date IN ("
+                "  SELECT DISTINCT forecast_date FROM forecasts WHERE symbol = ? "
+                "  ORDER BY forecast_date DESC LIMIT ?"
+                ") ORDER BY forecast_date, step",
+                (symbol, symbol, last),
+            ).fetchall()
+
+        forecast_data = {}
+        for forecast_date, date, upper, lower in rows:
+            data = forecast_data.setdefault(
+                forecast_date, {"date": [], "upper": [], "lower": []}
+            )
+            data["date"].append(date)
+            data["upper"].append(upper)
+            data["lower"].append(lower)
+
+        return forecast_data
+
+    def frame(self, symbols: list = None, forecast_date: str = None) -> pd.DataFrame:
+        """Bulk query as a long table, e.g. every symbol's forecast made on one date."""
+        query = "SELECT * FROM forecasts"
+        clauses = []
+        params = []
+        if symbols is not None:
+            clauses.append(f"symbol IN ({', '.join('?' * len(symbols))})")
+            params.extend(symbols)
+        if forecast_date is not None:
+            clauses.append("forecast_date = ?")
+            params.append(forecast_date)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+
+        with self.connect() as conn:
+            return pd.read_sql_query(
+                query + " ORDER BY symbol, forecast_date, step", conn, params=params
+            )
+
+    def import_json_folder(self, folder: str):
+        rows = []
+        for name in sorted(os.listdir(folder)):
+            if not name.endswith(".json"):
+                continue
+            with open(f"{folder}/{name}", "r") as f:
+                forecast_data = json.load(f)
+            symbol = name[: -len(".json")]
+            for forecast_date, data in forecast_data.items():
+                for step, values in enumerate(
+                    zip(data["date"], data["upper"], data["lower"])
+                ):
+                    rows.append((symbol, forecast_date, step, *values))
+
+        with self.connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO forecasts VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
@@ -1,12 +1,13 @@
-import yfinance as yf
 import pandas as pd
 import scripts.plotly_layouts as ply
 import datetime as dt
+from scripts.data_source import YFinanceSource
 # import datapane as dp
 
-def get_dividends(ticker):
+def get_dividends(ticker, source=None):
 
-    ticker = yf.Ticker(ticker)
+    source = source or YFinanceSource()
+    ticker = source.ticker(ticker)
 
     ## Dividends
     dividends = ticker.get_dividends()
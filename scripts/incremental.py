@@ -0,0 +1,496 @@
+import copy
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.signal import argrelmax, argrelmin
+
+# Same columns as PlotInfo.cal_technical_indicators (stock_plots.PLOT_INDICATORS)
+COLUMNS = [
+    "chg",
+    "5ma",
+    "10ma",
+    "20ma",
+    "5ema",
+    "12ema",
+    "20ema",
+    "26ema",
+    "60ema",
+    "std",
+    "upper_bb",
+    "lower_bb",
+    "macd",
+    "macd_signal",
+    "macd_hist",
+    "psar",
+    "psar_diff",
+]
+
+
+class Ewm:
+    """Running ``Series.ewm(span=span).mean()`` (adjust=True), same recurrence as pandas."""
+
+    def __init__(self, span):
+        com = (span - 1) / 2.0
+        self.old_wt_factor = 1.0 - 1.0 / (1.0 + com)
+        self.weighted = math.nan
+        self.old_wt = 1.0
+
+    def add(self, val: float) -> float:
+        if self.weighted == self.weighted:
+            self.old_wt *= self.old_wt_factor
+            if val == val:
+                if self.weighted != val:
+                    self.weighted = self.old_wt * self.weighted + val
+                    self.weighted /= self.old_wt + 1.0
+                self.old_wt += 1.0
+        elif val == val:
+            self.weighted = val
+        return self.weighted
+
+
+class RollingMean:
+    """Running ``Series.rolling(window).mean()`` with pandas' compensated sums."""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = []
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.same_count = 0
+        self.prev_value = math.nan
+
+    def add(self, val: float) -> float:
+        self.values.append(val)
+        if len(self.values) > self.window:
+            self.remove(self.values.pop(0))
+
+        if val == val:
+            self.nobs += 1
+            y = val - self.compensation_add
+            t = self.sum_x + y
+            self.compensation_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct += 1
+            if val == self.prev_value:
+                self.same_count += 1
+            else:
+                self.same_count = 1
+            self.prev_value = val
+
+        if self.nobs < self.window:
+            return math.nan
+        result = self.sum_x / self.nobs
+        if self.same_count >= self.nobs:
+            result = self.prev_value
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.0
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.0
+        return result
+
+    def remove(self, val: float):
+        if val == val:
+            self.nobs -= 1
+            y = -val - self.compensation_remove
+            t = self.sum_x + y
+            self.compensation_remove = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct -= 1
+
+
+class RollingStd:
+    """Running ``Series.rolling(window).std()`` using pandas' Welford updates."""
+
+    # pandas recomputes the window when an update loses too many digits
+    INV_COND_TOL = np.finfo(np.float64).eps * 1e3
+
+    def __init__(self, window, ddof=1):
+        self.window = window
+        self.ddof = ddof
+        self.values = []
+        self.reset()
+
+    def reset(self):
+        self.nobs = 0.0
+        self.mean_x = 0.0
+        self.ssqdm_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.unstable = False
+
+    def add(self, val: float) -> float:
+        self.values.append(val)
+        if len(self.values) > self.window:
+            self.remove(self.values.pop(0))
+        self.add_value(val)
+
+        if self.unstable:
+            self.reset()
+            for value in self.values:
+                self.add_value(value)
+            self.unstable = False
+
+        if self.nobs < self.window or self.nobs <= self.ddof:
+            return math.nan
+        return math.sqrt(max(self.ssqdm_x / (self.nobs - self.ddof), 0.0))
+
+    def add_value(self, val: float):
+        if val != val:
+            return
+        prev_m2 = self.ssqdm_x
+        self.nobs += 1
+        prev_mean = self.mean_x - self.compensation_add
+        y = val - self.compensation_add
+        t = y - self.mean_x
+        self.compensation_add = t + self.mean_x - y
+        self.mean_x = self.mean_x + t / self.nobs
+        self.ssqdm_x = self.ssqdm_x + (val - prev_mean) * (val - self.mean_x)
+        if prev_m2 * self.INV_COND_TOL > self.ssqdm_x:
+            self.unstable = True
+
+    def remove(self, val: float):
+        if val != val:
+            return
+        prev_m2 = self.ssqdm_x
+        self.nobs -= 1
+        if self.nobs:
+            prev_mean = self.mean_x - self.compensation_remove
+            y = val - self.compensation_remove
+            t = y - self.mean_x
+            self.compensation_remove = t + self.mean_x - y
+            self.mean_x = self.mean_x - t / self.nobs
+            self.ssqdm_x = self.ssqdm_x - (val - prev_mean) * (val - self.mean_x)
+            if prev_m2 * self.INV_COND_TOL > self.ssqdm_x:
+                self.unstable = True
+        else:
+            self.mean_x = 0.0
+            self.ssqdm_x = 0.0
+            self.unstable = False
+
+
+class Psar:
+    """Running PSAR, one step of scripts.indicators.psar_arrays per bar."""
+
+    def __init__(self, af_step=0.02, af_max=0.2):
+        self.af_step = af_step
+        self.af_max = af_max
+        self.started = False
+        self.bull = True
+        self.psar = math.nan
+        self.ep = math.nan
+        self.af = af_step
+
+    def add(self, high: float, low: float, close: float) -> float:
+        if not self.started:
+            self.started = True
+            self.psar = low
+            self.ep = high
+            return close
+
+        if self.bull:
+            self.psar = self.psar + self.af * (self.ep - self.psar)
+            if low < self.psar:
+                self.bull = False
+                self.psar = self.ep
+                self.ep = low
+                self.af = self.af_step
+            elif high > self.ep:
+                self.ep = high
+                self.af = min(self.af + self.af_step, self.af_max)
+        else:
+            self.psar = self.psar - self.af * (self.psar - self.ep)
+            if high > self.psar:
+                self.bull = True
+                self.psar = self.ep
+                self.ep = high
+                self.af = self.af_step
+            elif low < self.ep:
+                self.ep = low
+                self.af = min(self.af + self.af_step, self.af_max)
+
+        return self.psar
+
+
+class IndicatorState:
+    """Indicator accumulators for one symbol, updated in O(new bars).
+
+    Feeding the whole history at once, or in any number of later chunks, gives
+    the same columns as the batch pandas code over that history. A re-sent last
+    bar (e.g. a partial day being completed) replaces the one seen before.
+    """
+
+    def __init__(self, af_step=0.02, af_max=0.2):
+        self.last_date = None
+        self.last_close = math.nan
+        self.last_bar = None
+        self.prev_close = math.nan
+        self.ma = {i: RollingMean(i) for i in [5, 10, 20]}
+        self.ema = {i: Ewm(i) for i in [5, 12, 20, 26, 60]}
+        self.std = RollingStd(20)
+        self.macd_signal = Ewm(9)
+        self.psar = Psar(af_step, af_max)
+        self.previous = None
+
+    def update(self, bars: pd.DataFrame) -> pd.DataFrame:
+        """Consume new OHLC bars and return their indicator rows.
+
+        Nothing is returned when the only bar is the last one, unchanged.
+        """
+        if self.last_date is not None:
+            bars = bars.iloc[bars.index.searchsorted(self.last_date) :]
+            if len(bars) and bars.index[0] == self.last_date:
+                if len(bars) == 1 and self.last_bar == bar_values(bars):
+                    return pd.DataFrame(index=bars.index[:0], columns=COLUMNS)
+                self.rollback()
+
+        highs = bars["High"].to_numpy(dtype=np.float64).tolist()
+        lows = bars["Low"].to_numpy(dtype=np.float64).tolist()
+        closes = bars["Close"].to_numpy(dtype=np.float64).tolist()
+
+        out = np.empty((len(bars), len(COLUMNS)))
+        for i, (high, low, close) in enumerate(zip(highs, lows, closes)):
+            if i == len(closes) - 1:
+                self.previous = copy.deepcopy(self.__dict__ | {"previous": None})
+
+            chg = 100 * (1 - self.prev_close / close)
+            ma = [self.ma[n].add(close) for n in [5, 10, 20]]
+            ema = {n: self.ema[n].add(close) for n in [5, 12, 20, 26, 60]}
+            std = self.std.add(close)
+            macd = (ema[12] - ema[26]) / ema[26]
+            macd_signal = self.macd_signal.add(macd)
+            psar = self.psar.add(high, low, close)
+
+            out[i] = [
+                chg,
+                *ma,
+                *ema.values(),
+                std,
+                ma[2] + 2 * std,
+                ma[2] - 2 * std,
+                macd,
+                macd_signal,
+                macd - macd_signal,
+                psar,
+                (close - psar) / close,
+            ]
+            self.prev_close = close
+
+        if len(bars):
+            self.last_date = bars.index[-1]
+            self.last_close = closes[-1]
+            self.last_bar = bar_values(bars)
+
+        return pd.DataFrame(out, index=bars.index, columns=COLUMNS)
+
+    def rollback(self):
+        """Undo the last bar so it can be replaced."""
+        if self.previous is None:
+            raise ValueError("Only the most recent bar can be replaced")
+        self.__dict__.update(self.previous)
+        self.previous = None
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(encode_state(self.__dict__), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IndicatorState":
+        state = cls()
+        with open(path, "r") as f:
+            state.__dict__.update(decode_state(json.load(f)))
+        return state
+
+
+class ExtremaState:
+    """Running argrelmax(High) / argrelmin(Low) for one symbol, updated in O(new bars).
+
+    A bar is confirmed as a peak or trough once ``order`` bars after it are
+    known; from then on argrelmax's answer for it never changes. Only the last
+    2 * order + 1 bars are buffered, and confirmed extrema older than ``keep``
+    bars are dropped. Positions count bars from the start of the history fed in.
+    """
+
+    def __init__(self, order=4, keep=1000):
+        self.order = order
+        self.keep = keep
+        self.last_date = None
+        self.last_bar = None
+        self.count = 0
+        self.highs = []
+        self.lows = []
+        self.max_pos = []
+        self.min_pos = []
+        self.previous = None
+
+    def update(self, bars: pd.DataFrame) -> bool:
+        """Consume new High/Low bars, a re-sent last bar replaces the one seen before.
+
+        False when nothing changed (only the last bar again, unchanged).
+        """
+        if not len(bars) or (
+            bars.index[-1] == self.last_date and self.last_bar == high_low(bars)
+        ):
+            return False
+        if self.last_date is not None:
+            bars = bars.iloc[bars.index.searchsorted(self.last_date) :]
+            if len(bars) and bars.index[0] == self.last_date:
+                self.rollback()
+
+        highs = bars["High"].to_numpy(dtype=np.float64).tolist()
+        lows = bars["Low"].to_numpy(dtype=np.float64).tolist()
+        for i, (high, low) in enumerate(zip(highs, lows)):
+            if i == len(highs) - 1:
+                # The buffers are small, the extrema lists are trimmed on rollback
+                self.previous = {
+                    "count": self.count,
+                    "last_date": self.last_date,
+                    "last_bar": self.last_bar,
+                    "highs": list(self.highs),
+                    "lows": list(self.lows),
+                }
+            self.add(high, low)
+
+        self.last_date = bars.index[-1]
+        self.last_bar = high_low(bars)
+        oldest = self.count - self.keep
+        self.max_pos = [pos for pos in self.max_pos if pos >= oldest]
+        self.min_pos = [pos for pos in self.min_pos if pos >= oldest]
+
+        return True
+
+    def add(self, high: float, low: float):
+        self.highs.append(high)
+        self.lows.append(low)
+        self.count += 1
+        if len(self.highs) > 2 * self.order + 1:
+            del self.highs[0], self.lows[0]
+        if len(self.highs) < 2 * self.order + 1:
+            return
+
+        # The middle bar of the buffer now has all of its neighbours
+        pos = self.count - 1 - self.order
+        middle = self.order
+        high, low = self.highs[middle], self.lows[middle]
+        others = [i for i in range(2 * self.order + 1) if i != middle]
+        if all(high > self.highs[i] for i in others):
+            self.max_pos.append(pos)
+        if all(low < self.lows[i] for i in others):
+            self.min_pos.append(pos)
+
+    def rollback(self):
+        """Undo the last bar so it can be replaced."""
+        if self.previous is None:
+            raise ValueError("Only the most recent bar can be replaced")
+        self.__dict__.update(self.previous)
+        self.previous = None
+        # The undone bar could only have confirmed the bar order before it
+        confirmed = self.count - self.order
+        self.max_pos = [pos for pos in self.max_pos if pos < confirmed]
+        self.min_pos = [pos for pos in self.min_pos if pos < confirmed]
+
+    def window_idx(self, df: pd.DataFrame, order: int = None) -> tuple:
+        """Same as argrelmax(df["High"]) / argrelmin(df["Low"]) for a trailing window.
+
+        The inner bars come from the confirmed extrema, only the ``order`` bars
+        at each end of the window, where argrelmax clips its comparisons, are
+        compared again. Any other window is scanned in full.
+        """
+        order = self.order if order is None else order
+        high = df["High"].to_numpy(dtype=np.float64)
+        low = df["Low"].to_numpy(dtype=np.float64)
+        n = len(df)
+
+        trailing = (
+            0 < n <= min(self.count, self.keep) and df.index[-1] == self.last_date
+        )
+        if order != self.order or not trailing or n <= 2 * order:
+            return argrelmax(high, order=order)[0], argrelmin(low, order=order)[0]
+
+        start = self.count - n
+        edges = np.concatenate((np.arange(order), np.arange(n - order, n)))
+        idx = []
+        for positions, values, comparator in [
+            (self.max_pos, high, np.greater),
+            (self.min_pos, low, np.less),
+        ]:
+            inner = np.array(positions, dtype=np.int64) - start
+            inner = inner[(inner >= order) & (inner < n - order)]
+            outer = edges[clipped_extrema(values, edges, order, comparator)]
+            idx.append(np.sort(np.concatenate((inner, outer))))
+
+        return idx[0], idx[1]
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(encode_state(self.__dict__), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ExtremaState":
+        state = cls()
+        with open(path, "r") as f:
+            state.__dict__.update(decode_state(json.load(f)))
+        return state
+
+
+def clipped_extrema(
+    values: np.ndarray, positions: np.ndarray, order: int, comparator
+) -> np.ndarray:
+    """argrelextrema's test at a few positions, with the same clipping at the ends."""
+    offsets = np.concatenate((np.arange(-order, 0), np.arange(1, order + 1)))
+    neighbours = np.clip(positions[:, None] + offsets, 0, len(values) - 1)
+
+    return comparator(values[positions][:, None], values[neighbours]).all(axis=1)
+
+
+def bar_values(bars: pd.DataFrame) -> list:
+    """High, low and close of the last bar, as plain floats."""
+    return [float(bars[col].iat[-1]) for col in ["High", "Low", "Close"]]
+
+
+def high_low(bars: pd.DataFrame) -> list:
+    return [float(bars["High"].iat[-1]), float(bars["Low"].iat[-1])]
+
+
+def encode_state(value):
+    # Plain JSON for the accumulator objects; NaN is kept as JSON's NaN literal
+    if isinstance(value, (Ewm, RollingMean, RollingStd, Psar)):
+        return {"__class__": type(value).__name__, **encode_state(value.__dict__)}
+    if isinstance(value, pd.Timestamp):
+        return {"__timestamp__": value.isoformat()}
+    if isinstance(value, dict):
+        return {str(k): encode_state(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [encode_state(v) for v in value]
+    return value
+
+
+def decode_state(value):
+    if isinstance(value, list):
+        return [decode_state(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if "__timestamp__" in value:
+        return pd.Timestamp(value["__timestamp__"])
+    if "__class__" in value:
+        klass = {c.__name__: c for c in [Ewm, RollingMean, RollingStd, Psar]}[
+            value["__class__"]
+        ]
+        obj = klass.__new__(klass)
+        obj.__dict__.update(
+            {k: decode_state(v) for k, v in value.items() if k != "__class__"}
+        )
+        return obj
+    # Integer keys (window sizes / spans) come back from JSON as strings
+    return {int(k) if k.isdigit() else k: decode_state(v) for k, v in value.items()}
@@ -0,0 +1,199 @@
+import numpy as np
+import pandas as pd
+
+from scripts.indicators import psar_arrays
+
+# name -> (inputs, func). Inputs are price columns or other indicators, func gets
+# the window ops followed by one float64 array per input
+INDICATORS = {}
+
+
+def register(name: str, inputs: list, func):
+    INDICATORS[name] = (inputs, func)
+
+
+class SeriesOps:
+    """Window operations over a single price history."""
+
+    def group(self, values):
+        return pd.Series(values)
+
+    def psar(self, high, low, close) -> np.ndarray:
+        return psar_arrays(high, low, close)[0]
+
+
+class PanelOps:
+    """Window operations over a long format panel sorted by symbol.
+
+    codes numbers the symbol of every row; windows never cross from one symbol
+    into the next, so each symbol gets what SeriesOps would give it alone.
+    """
+
+    def __init__(self, codes: np.ndarray):
+        self.codes = codes
+        self.bounds = np.flatnonzero(np.diff(codes)) + 1
+
+    def group(self, values):
+        return pd.Series(values).groupby(self.codes, sort=False)
+
+    def psar(self, high, low, close) -> np.ndarray:
+        psar = np.empty(len(high))
+        starts = np.r_[0, self.bounds]
+        stops = np.r_[self.bounds, len(high)]
+        for start, stop in zip(starts, stops):
+            psar[start:stop] = psar_arrays(
+                high[start:stop], low[start:stop], close[start:stop]
+            )[0]
+        return psar
+
+
+def resolve(names: list, given=()) -> list:
+    """Indicators to compute for names, each after the ones it reads."""
+    order = []
+
+    def visit(name, path):
+        if name in order or name in given:
+            return
+        if name not in INDICATORS:
+            raise KeyError(f"Unknown indicator or missing column: {name}")
+        if name in path:
+            raise ValueError(f"Indicator dependency cycle: {' -> '.join(path)}")
+        for dependency in INDICATORS[name][0]:
+            visit(dependency, path + [name])
+        order.append(name)
+
+    for name in names:
+        visit(name, [])
+
+    return order
+
+
+def compute_indicators(
+    prices: pd.DataFrame, names: list, ops=None, out: np.ndarray = None
+) -> pd.DataFrame:
+    """Compute names over prices in one pass, each indicator once.
+
+    Inputs that prices already has as columns are read from it instead of being
+    computed (so a moving average added earlier is reused). The requested
+    columns are written into one preallocated frame, in names order; out can
+    hand in the (rows x names) array to fill.
+    """
+    names = list(names)
+    ops = ops or SeriesOps()
+    given = [col for col in prices.columns if col not in names]
+    arrays = {}
+
+    def array(name):
+        if name not in arrays:
+            arrays[name] = prices[name].to_numpy(dtype=np.float64)
+        return arrays[name]
+
+    for name in resolve(names, given):
+        inputs, func = INDICATORS[name]
+        result = func(ops, *[array(dependency) for dependency in inputs])
+        arrays[name] = np.asarray(result, dtype=np.float64)
+
+    if out is None:
+        out = np.empty((len(prices), len(names)), dtype=np.float64)
+    for i, name in enumerate(names):
+        out[:, i] = array(name)
+
+    return pd.DataFrame(out, index=prices.index, columns=names, copy=False)
+
+
+def stochastic_k(ops, high, low, close, window):
+    window_low = ops.group(low).rolling(window).min().to_numpy()
+    window_high = ops.group(high).rolling(window).max().to_numpy()
+    return (close - window_low) / (window_high - window_low)
+
+
+# Price changes
+register(
+    "interday_chg", ["Open", "Close"], lambda ops, open_, close: (close - open_) / open_
+)
+register("day_change", ["Close"], lambda ops, close: ops.group(close).pct_change())
+register(
+    "chg", ["Close"], lambda ops, close: 100 * (1 - ops.group(close).shift(1) / close)
+)
+
+# Moving averages and Bollinger bands
+for span in [3, 5, 10, 12, 20, 26, 60]:
+    register(
+        f"ma{span}",
+        ["Close"],
+        lambda ops, close, span=span: ops.group(close).rolling(span).mean(),
+    )
+    register(
+        f"ema{span}",
+        ["Close"],
+        lambda ops, close, span=span: ops.group(close).ewm(span=span).mean(),
+    )
+register("std20", ["Close"], lambda ops, close: ops.group(close).rolling(20).std())
+register("upper_bb", ["ma20", "std20"], lambda ops, ma, std: ma + 2 * std)
+register("lower_bb", ["ma20", "std20"], lambda ops, ma, std: ma - 2 * std)
+
+# MACD
+register("macd", ["ema12", "ema26"], lambda ops, ema12, ema26: (ema12 - ema26) / ema26)
+register("macd_signal", ["macd"], lambda ops, macd: ops.group(macd).ewm(span=9).mean())
+register("macd_hist", ["macd", "macd_signal"], lambda ops, macd, signal: macd - signal)
+for window in [3, 5]:
+    register(
+        f"macd_ma{window}",
+        ["macd_hist"],
+        lambda ops, hist, window=window: ops.group(hist).rolling(window).mean(),
+    )
+for lag in [1, 2, 3]:
+    register(
+        f"macd_{lag}d_diff",
+        ["macd_hist"],
+        lambda ops, hist, lag=lag: hist - ops.group(hist).shift(lag),
+    )
+
+# PSAR with the default 0.02 / 0.2 acceleration
+register("psar", ["High", "Low", "Close"], lambda ops, *prices: ops.psar(*prices))
+register(
+    "psar_diff", ["Close", "psar"], lambda ops, close, psar: (close - psar) / close
+)
+
+# Volume
+for window in [5, 10, 20]:
+    register(
+        f"vol{window}",
+        ["Volume"],
+        lambda ops, volume, window=window: (
+            ops.group(volume).rolling(window).mean() / volume
+        ),
+    )
+
+
+# Stochastic oscillator
+for window in [7, 23]:
+    register(
+        f"os_k{window}",
+        ["High", "Low", "Close"],
+        lambda ops, *prices, window=window: stochastic_k(ops, *prices, window),
+    )
+    register(
+        f"os_d{window}",
+        [f"os_k{window}"],
+        lambda ops, os_k: ops.group(os_k).rolling(3).mean(),
+    )
+    register(
+        f"os_kd{window}",
+        [f"os_k{window}", f"os_d{window}"],
+        lambda ops, os_k, os_d: os_k - os_d,
+    )
+    for lag in [1, 2]:
+        register(
+            f"os_kd{window}_{lag}d",
+            [f"os_kd{window}"],
+            lambda ops, os_kd, lag=lag: os_kd - ops.group(os_kd).shift(lag),
+        )
+
+# Volatility of day_change
+for window in [5, 20, 60]:
+    register(
+        f"volatility{window}",
+        ["day_change"],
+        lambda ops, change, window=window: ops.group(change).rolling(window).std(),
+    )
@@ -1,51 +1,198 @@
 import numpy as np
+import pandas as pd
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
-def calculate_psar(stock_data, af_step=0.02, af_max=0.2):
-    data = stock_data.copy()
-
-    # Initialize columns
-    psar_array = np.zeros(len(data))
-    af_array = np.full(len(data), af_step)
 
+def _psar_loop(
+    high, low, close, af_step, af_max, psar_array, af_array, ep_array, trend_array
+):
+    """Walk the bars once and fill the preallocated psar/af/ep/trend arrays."""
     # Initial values
     bull = True
-    psar = data.iloc[0]["Low"]
-    ep = data.iloc[0]["High"]
+    psar = low[0]
+    ep = high[0]
+    af = af_step
+    ep_array[0] = ep
 
-    for i in range(1, len(data)):
+    for i in range(1, len(high)):
         if bull:
-            psar = psar + af_array[i - 1] * (ep - psar)
-            if data.iloc[i]["Low"] < psar:
+            psar = psar + af * (ep - psar)
+            if low[i] < psar:
                 bull = False
                 psar = ep
-                ep = data.iloc[i]["Low"]
-                af_array[i] = af_step
-            else:
-                if data.iloc[i]["High"] > ep:
-                    ep = data.iloc[i]["High"]
-                    af_array[i] = min(af_array[i - 1] + af_step, af_max)
-                else:
-                    af_array[i] = af_array[i - 1]
+                ep = low[i]
+                af = af_step
+            elif high[i] > ep:
+                ep = high[i]
+                af = min(af + af_step, af_max)
         else:
-            psar = psar - af_array[i - 1] * (psar - ep)
-            if data.iloc[i]["High"] > psar:
+            psar = psar - af * (psar - ep)
+            if high[i] > psar:
                 bull = True
                 psar = ep
-                ep = data.iloc[i]["High"]
-                af_array[i] = af_step
-            else:
-                if data.iloc[i]["Low"] < ep:
-                    ep = data.iloc[i]["Low"]
-                    af_array[i] = min(af_array[i - 1] + af_step, af_max)
-                else:
-                    af_array[i] = af_array[i - 1]
+                ep = high[i]
+                af = af_step
+            elif low[i] < ep:
+                ep = low[i]
+                af = min(af + af_step, af_max)
 
         psar_array[i] = psar
+        af_array[i] = af
+        ep_array[i] = ep
+        trend_array[i] = bull
+
+    psar_array[0] = close[0]
+
+
+_psar_loop_jit = njit(cache=True)(_psar_loop) if njit is not None else None
+
+
+def psar_arrays(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    af_step: float = 0.02,
+    af_max: float = 0.2,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Compute PSAR on raw price arrays, returning psar, af, ep and trend (True = bull).
+
+    Uses numba when it is installed, otherwise the same loop runs over plain
+    Python floats, which is far cheaper than indexing the DataFrame per bar.
+    """
+    high = np.ascontiguousarray(high, dtype=np.float64)
+    low = np.ascontiguousarray(low, dtype=np.float64)
+    close = np.ascontiguousarray(close, dtype=np.float64)
+
+    n = len(high)
+    psar_array = np.zeros(n)
+    af_array = np.full(n, af_step, dtype=np.float64)
+    ep_array = np.zeros(n)
+    trend_array = np.ones(n, dtype=np.bool_)
+
+    if _psar_loop_jit is not None:
+        _psar_loop_jit(
+            high,
+            low,
+            close,
+            af_step,
+            af_max,
+            psar_array,
+            af_array,
+            ep_array,
+            trend_array,
+        )
+    else:
+        _psar_loop(
+            high.tolist(),
+            low.tolist(),
+            close.tolist(),
+            af_step,
+            af_max,
+            psar_array,
+            af_array,
+            ep_array,
+            trend_array,
+        )
+
+    return psar_array, af_array, ep_array, trend_array
+
+
+def calculate_psar(stock_data, af_step=0.02, af_max=0.2):
+    data = stock_data.copy()
 
-    psar_array[0] = data.iloc[0]["Close"]
+    psar_array, _, _, _ = psar_arrays(
+        data["High"].to_numpy(),
+        data["Low"].to_numpy(),
+        data["Close"].to_numpy(),
+        af_step,
+        af_max,
+    )
 
     data["psar"] = psar_array
     data["psar_diff"] = (data["Close"] - psar_array) / data["Close"]
 
     return data
+
+
+def psar_panel(high, low, close, af_step=0.02, af_max=0.2):
+    """Compute PSAR for every column of aligned (dates x tickers) price panels at once.
+
+    Accepts DataFrames (e.g. the wide frames from yf.download) or 2-D arrays. Each
+    column starts on its first complete High/Low/Close row, earlier rows are NaN,
+    and the result matches psar_arrays run on that column on its own.
+    """
+    frame = high if isinstance(high, pd.DataFrame) else None
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+
+    n_dates, n_tickers = high.shape
+    psar_out = np.full((n_dates, n_tickers), np.nan)
+    af_out = np.full((n_dates, n_tickers), np.nan)
+    ep_out = np.full((n_dates, n_tickers), np.nan)
+    trend_out = np.zeros((n_dates, n_tickers), dtype=np.bool_)
+
+    valid = ~(np.isnan(high) | np.isnan(low) | np.isnan(close))
+    start = np.where(valid.any(axis=0), valid.argmax(axis=0), n_dates)
+
+    psar = np.zeros(n_tickers)
+    ep = np.zeros(n_tickers)
+    af = np.full(n_tickers, af_step)
+    bull = np.ones(n_tickers, dtype=np.bool_)
+
+    for i in range(n_dates):
+        h = high[i]
+        l = low[i]
+        active = i > start
+
+        # Bull columns: move psar up towards ep, flip when the low breaks it
+        cand = psar + af * (ep - psar)
+        flip = l < cand
+        new_ep = h > ep
+        bull_psar = np.where(flip, ep, cand)
+        bull_ep = np.where(flip, l, np.where(new_ep, h, ep))
+        bull_af = np.where(
+            flip, af_step, np.where(new_ep, np.minimum(af + af_step, af_max), af)
+        )
+        bull_next = ~flip
+
+        # Bear columns: move psar down towards ep, flip when the high breaks it
+        cand = psar - af * (psar - ep)
+        flip = h > cand
+        new_ep = l < ep
+        bear_psar = np.where(flip, ep, cand)
+        bear_ep = np.where(flip, h, np.where(new_ep, l, ep))
+        bear_af = np.where(
+            flip, af_step, np.where(new_ep, np.minimum(af + af_step, af_max), af)
+        )
+        bear_next = flip
+
+        psar = np.where(active, np.where(bull, bull_psar, bear_psar), psar)
+        ep = np.where(active, np.where(bull, bull_ep, bear_ep), ep)
+        af = np.where(active, np.where(bull, bull_af, bear_af), af)
+        bull = np.where(active, np.where(bull, bull_next, bear_next), bull)
+
+        # First bar of each column seeds the state
+        first = i == start
+        psar = np.where(first, l, psar)
+        ep = np.where(first, h, ep)
+        af = np.where(first, af_step, af)
+        bull = bull | first
+
+        started = i >= start
+        psar_out[i] = np.where(first, close[i], np.where(started, psar, np.nan))
+        af_out[i] = np.where(started, af, np.nan)
+        ep_out[i] = np.where(started, ep, np.nan)
+        trend_out[i] = started & bull
+
+    if frame is not None:
+        return tuple(
+            pd.DataFrame(out, index=frame.index, columns=frame.columns)
+            for out in (psar_out, af_out, ep_out, trend_out)
+        )
+
+    return psar_out, af_out, ep_out, trend_out
@@ -0,0 +1,136 @@
+import numpy as np
+
+# Expiries fetched per ticker for the forecast cone (about five weeks)
+FORECAST_EXPIRIES = 5
+
+# Implied vols outside this range are placeholders of contracts without quotes
+MIN_IV = 0.01
+MAX_IV = 5.0
+
+# A contract counts as quoted when any of these is positive (if the chain has them)
+LIQUIDITY_COLUMNS = ["bid", "ask", "volume", "openInterest"]
+
+
+def chain_table(chains: dict) -> dict:
+    """Calls and puts of every expiry as one table of arrays, sorted by expiry,
+    side and strike.
+
+    chains maps expiry dates to OptionChain (calls, puts). The arrays are
+    expiry, call, strike, iv and quoted (a usable implied vol of a traded
+    contract); sides that are empty or lack strikes/implied vols are left out.
+    """
+    expiry, call, strike, iv, quoted = [], [], [], [], []
+    for date, chain in chains.items():
+        for is_call, side in [(True, chain.calls), (False, chain.puts)]:
+            if side is None or side.empty:
+                continue
+            if "strike" not in side or "impliedVolatility" not in side:
+                continue
+
+            side_strike = side["strike"].to_numpy(dtype=np.float64)
+            side_iv = side["impliedVolatility"].to_numpy(dtype=np.float64)
+            side_quoted = (side_iv > MIN_IV) & (side_iv < MAX_IV)
+            side_quoted &= np.isfinite(side_strike)
+            liquidity = [col for col in LIQUIDITY_COLUMNS if col in side]
+            if liquidity:
+                traded = np.zeros(len(side), dtype=bool)
+                for col in liquidity:
+                    traded |= side[col].to_numpy(dtype=np.float64) > 0
+                side_quoted &= traded
+
+            expiry.append(np.full(len(side), date, dtype=object))
+            call.append(np.full(len(side), is_call))
+            strike.append(side_strike)
+            iv.append(side_iv)
+            quoted.append(side_quoted)
+
+    if not expiry:
+        return {
+            "expiry": np.empty(0, dtype=object),
+            "call": np.empty(0, dtype=bool),
+            "strike": np.empty(0),
+            "iv": np.empty(0),
+            "quoted": np.empty(0, dtype=bool),
+        }
+
+    table = {
+        "expiry": np.concatenate(expiry),
+        "call": np.concatenate(call),
+        "strike": np.concatenate(strike),
+        "iv": np.concatenate(iv),
+        "quoted": np.concatenate(quoted),
+    }
+    order = np.lexsort((table["strike"], table["call"], table["expiry"]))
+
+    return {name: values[order] for name, values in table.items()}
+
+
+def atm_iv(table: dict, spot: float) -> tuple[np.ndarray, np.ndarray]:
+    """Implied vol at the spot price of every expiry in the table: (expiries, ivs).
+
+    Calls and puts are each interpolated linearly between the quoted strikes
+    around spot (the nearest quoted strike when spot is outside them) and then
+    averaged. Expiries without a quoted contract get NaN.
+    """
+    expiries, codes = np.unique(table["expiry"], return_inverse=True)
+    result = np.full(len(expiries), np.nan)
+    quoted = table["quoted"]
+    if not quoted.any():
+        return expiries, result
+
+    # The table is sorted, so every (expiry, side) group is one run of rows
+    expiry = codes[quoted]
+    call = table["call"][quoted]
+    strike = table["strike"][quoted]
+    iv = table["iv"][quoted]
+    n = len(strike)
+    new_group = np.r_[True, (expiry[1:] != expiry[:-1]) | (call[1:] != call[:-1])]
+    starts = np.flatnonzero(new_group)
+    stops = np.r_[starts[1:], n]
+
+    rows = np.arange(n)
+    below = np.maximum.reduceat(np.where(strike <= spot, rows, -1), starts)
+    above = np.minimum.reduceat(np.where(strike >= spot, rows, n), starts)
+    lo = np.where(below >= 0, below, starts)
+    hi = np.where(above < n, above, stops - 1)
+
+    width = strike[hi] - strike[lo]
+    weight = np.divide(
+        spot - strike[lo], width, out=np.zeros(len(starts)), where=width > 0
+    )
+    side_iv = iv[lo] + weight * (iv[hi] - iv[lo])
+
+    # Mean of the call and put of each expiry, or the one side it has
+    sides = np.bincount(expiry[starts], minlength=len(expiries))
+    total = np.bincount(expiry[starts], weights=side_iv, minlength=len(expiries))
+    np.divide(total, sides, out=result, where=sides > 0)
+
+    return expiries, result
+
+
+def forecast_cone(chains: dict, spot: float, last_date: str) -> dict:
+    """Expected move cone over every expiry: spot +- spot * atm iv * sqrt(days / 365).
+
+    Arrays date, days, iv, upper and lower with one entry per expiry after
+    last_date; expiries without a usable implied vol (empty or illiquid
+    chains) are left out.
+    """
+    expiries, iv = atm_iv(chain_table(chains), spot)
+    dates = expiries.astype(str)
+    days = (dates.astype("datetime64[D]") - np.datetime64(last_date, "D")).astype(int)
+    keep = (days > 0) & ~np.isnan(iv)
+    move = spot * iv[keep] * np.sqrt(days[keep] / 365)
+
+    return {
+        "date": dates[keep],
+        "days": days[keep],
+        "iv": iv[keep],
+        "upper": spot + move,
+        "lower": spot - move,
+    }
+
+
+def near_move_percent(cone: dict) -> float:
+    """Expected move to the first expiry in percent of spot, to two decimals."""
+    spot = (cone["upper"][0] + cone["lower"][0]) / 2
+    return int(1e4 * (cone["upper"][0] - spot) / spot) / 1e2
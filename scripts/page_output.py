@@ -0,0 +1,251 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import plotly
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Trace attributes that carry one value per bar
+DATA_KEYS = ["x", "y", "open", "high", "low", "close", "text"]
+
+# Midnight timestamps render the same as plain dates, plotly.js drops the offset
+MIDNIGHT = re.compile(r"T00:00:00(?:\.0+)?(?:[+-]\d\d:\d\d|Z)?$")
+
+
+def encode_figure(fig, compact: bool = True, base=None, kind: str = None) -> str:
+    """Serialize a figure for the page.
+
+    The compact form stores numeric arrays as base64 typed arrays and keeps the
+    date axis once per figure under "shared"; traces point at it with
+    {"shared": "x"} and the page swaps it back in before plotting. With a
+    FigureBase the layout and trace styles shared by the page are left out,
+    see FigureBase.split.
+    """
+    if not compact:
+        return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+
+    fig_dict = fig.to_plotly_json()
+    date_arrays = []
+    converted = []
+    for trace in fig_dict["data"]:
+        for key in DATA_KEYS:
+            if key not in trace:
+                continue
+            value = trace[key]
+            if is_date_array(value):
+                trace[key] = date_strings(value, converted)
+                date_arrays.append((trace, key))
+            elif is_numeric_array(value):
+                trace[key] = typed_array(value)
+
+    # Date axes used by more than one trace are stored once
+    shared = {}
+    names = {}
+    counts = Counter(tuple(trace[key]) for trace, key in date_arrays)
+    for trace, key in date_arrays:
+        dates = tuple(trace[key])
+        if counts[dates] < 2:
+            continue
+        if dates not in names:
+            names[dates] = "x" if not names else f"x{len(names) + 1}"
+            shared[names[dates]] = trace[key]
+        trace[key] = {"shared": names[dates]}
+
+    if shared:
+        fig_dict["shared"] = shared
+
+    if base is not None:
+        fig_dict = base.split(kind, fig_dict)
+
+    return json.dumps(fig_dict, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+class FigureBase:
+    """Layouts and trace styles shared by every ticker of a page, sent once.
+
+    layouts maps a figure kind ("candle", "small1", ...) to the layout every
+    figure of that kind starts from. A split figure keeps only what differs
+    from it (titles, ranges) under "layout", and its traces keep their data
+    arrays plus {"style": key} for the rest; the page merges them back.
+    """
+
+    def __init__(self, layouts: dict):
+        self.layouts = layouts
+        self.styles = {}
+
+    def split(self, kind: str, fig_dict: dict) -> dict:
+        layout = layout_delta(fig_dict["layout"], self.layouts[kind])
+        if layout is None:
+            # Not built from the base layout, send it whole
+            return fig_dict
+
+        data = []
+        for trace in fig_dict["data"]:
+            style, arrays = split_trace(trace)
+            key = hashlib.sha1(
+                json.dumps(
+                    style, sort_keys=True, cls=plotly.utils.PlotlyJSONEncoder
+                ).encode("utf-8")
+            ).hexdigest()[:12]
+            self.styles[key] = style
+            data.append({**arrays, "style": key})
+
+        return {**fig_dict, "base": kind, "data": data, "layout": layout}
+
+    def update(self, styles: dict):
+        # Styles collected by the build workers
+        self.styles.update(styles)
+
+    def to_json(self) -> str:
+        # The layouts normally share one plotly theme, keep a single copy of it
+        themes = [layout.get("template") for layout in self.layouts.values()]
+        if (
+            themes
+            and themes[0] is not None
+            and all(theme == themes[0] for theme in themes)
+        ):
+            base = {
+                "template": themes[0],
+                "layouts": {
+                    kind: {
+                        key: value for key, value in layout.items() if key != "template"
+                    }
+                    for kind, layout in self.layouts.items()
+                },
+            }
+        else:
+            base = {"layouts": self.layouts}
+
+        return json.dumps(
+            {**base, "styles": self.styles}, cls=plotly.utils.PlotlyJSONEncoder
+        )
+
+
+def layout_delta(layout: dict, base: dict):
+    """The part of layout that differs from base, None if base has extra keys."""
+    if any(key not in layout for key in base):
+        return None
+
+    delta = {}
+    for key, value in layout.items():
+        if key not in base:
+            delta[key] = value
+        elif isinstance(value, dict) and isinstance(base[key], dict):
+            nested = layout_delta(value, base[key])
+            if nested is None:
+                return None
+            if nested:
+                delta[key] = nested
+        elif not same_value(value, base[key]):
+            delta[key] = value
+
+    return delta
+
+
+def same_value(a, b) -> bool:
+    if a is b:
+        return True
+    try:
+        return type(a) is type(b) and bool(a == b)
+    except ValueError:
+        # numpy arrays inside, compare them as different
+        return False
+
+
+def split_trace(trace: dict) -> tuple[dict, dict]:
+    """Split a trace into its style and its per bar arrays (also in nested dicts)."""
+    style = {}
+    arrays = {}
+    for key, value in trace.items():
+        if key in DATA_KEYS or is_array_value(value):
+            arrays[key] = value
+        elif isinstance(value, dict):
+            nested_style, nested_arrays = split_trace(value)
+            if nested_style or not nested_arrays:
+                style[key] = nested_style
+            if nested_arrays:
+                arrays[key] = nested_arrays
+        else:
+            style[key] = value
+
+    return style, arrays
+
+
+def is_array_value(value) -> bool:
+    if isinstance(value, dict):
+        return "bdata" in value or "shared" in value
+    return isinstance(value, (list, tuple, np.ndarray, pd.Series, pd.Index))
+
+
+def date_strings(value, converted: list) -> list:
+    """ISO dates of a date array, reusing the strings of an equal array seen before.
+
+    Most traces of a figure are drawn over the same dates, converting them once
+    per figure instead of once per trace.
+    """
+    for dates, strings in converted:
+        if len(dates) == len(value) and np.array_equal(dates, value):
+            return list(strings)
+
+    strings = [MIDNIGHT.sub("", date.isoformat()) for date in pd.DatetimeIndex(value)]
+    converted.append((value, strings))
+
+    return list(strings)
+
+
+def is_date_array(value) -> bool:
+    if isinstance(value, pd.DatetimeIndex):
+        return True
+    if not isinstance(value, np.ndarray) or value.ndim != 1 or len(value) == 0:
+        return False
+    return value.dtype.kind == "M" or isinstance(value[0], pd.Timestamp)
+
+
+def is_numeric_array(value) -> bool:
+    if isinstance(value, (pd.Series, pd.Index)):
+        value = value.to_numpy()
+    if isinstance(value, np.ndarray):
+        return value.dtype.kind in "iuf" and value.ndim == 1
+    return False
+
+
+def typed_array(value) -> dict:
+    values = np.asarray(value, dtype="<f8")
+    return {"dtype": "f8", "bdata": base64.b64encode(values.tobytes()).decode("ascii")}
+
+
+def vendor_plotly_js(site_root: str = ".") -> str:
+    """Copy the plotly.js bundled with plotly.py under static/vendor, return its URL.
+
+    The file name carries the version so it can be cached as immutable.
+    """
+    name = f"plotly-{get_plotlyjs_version()}.min.js"
+    folder = f"{site_root}/static/vendor"
+    if not os.path.exists(f"{folder}/{name}"):
+        os.makedirs(folder, exist_ok=True)
+        write_compressed(f"{folder}/{name}", get_plotlyjs())
+
+    return f"/vendor/{name}"
+
+
+def write_compressed(path: str, text: str):
+    """Write a file along with precompressed .gz (and .br when brotli is installed)."""
+    data = text.encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(data)
+    with open(f"{path}.gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(f"{path}.br", "wb") as f:
+            f.write(brotli.compress(data))
@@ -1,127 +1,123 @@
+import os
+
 import pandas as pd
 import numpy as np
 import yfinance as yf
 
+from scripts.indicator_registry import PanelOps, compute_indicators
+from scripts.indicators import psar_arrays
+
+# preprocess() features in the order they are added. ema3 belongs to the target,
+# the first block is divided by Close (interday_chg and day_change included)
+UNNORM_FEATURES = [
+    "interday_chg",
+    "day_change",
+    "ma3",
+    "ma5",
+    "ema5",
+    "ma10",
+    "ema10",
+    "ma20",
+    "ema20",
+    "ma60",
+    "ema60",
+    "upper_bb",
+    "lower_bb",
+    "psar",
+]
+FEATURES = UNNORM_FEATURES + [
+    "macd_hist",
+    "macd_ma3",
+    "macd_ma5",
+    "macd_1d_diff",
+    "macd_2d_diff",
+    "macd_3d_diff",
+    "vol5",
+    "vol10",
+    "vol20",
+    *[
+        name
+        for i in [7, 23]
+        for name in [
+            f"os_k{i}",
+            f"os_d{i}",
+            f"os_kd{i}",
+            f"os_kd{i}_1d",
+            f"os_kd{i}_2d",
+        ]
+    ],
+    "volatility5",
+    "volatility20",
+    "volatility60",
+]
+TARGETS = ["short_target", "long_target"]
+
 
 def download_data(stocks):
     stocks_str = " ".join(stocks)
     return yf.Tickers(stocks_str)
 
 
-def add_moving_average(df):
-    df["interday_chg"] = (df["Close"] - df["Open"]) / df["Open"]
-    df["day_change"] = df["Close"].pct_change()
+def add_indicators(df, names):
+    """Add registry indicators as columns, reusing the ones df already has."""
+    indicators = compute_indicators(df, names)
+    for name in names:
+        df[name] = indicators[name]
+
+    return df
+
 
+def add_moving_average(df):
+    names = ["interday_chg", "day_change"]
     for i in [3, 5, 10, 20, 60]:
-        df[f"ma{i}"] = df["Close"].rolling(i).mean()
-        df[f"ema{i}"] = df["Close"].ewm(span=i).mean()
+        names += [f"ma{i}", f"ema{i}"]
 
-    return df
+    return add_indicators(df, names)
 
 
 def add_volatility(df):
     if "day_change" not in df.columns:
-        df["day_change"] = df["Close"].pct_change()
+        df = add_indicators(df, ["day_change"])
 
-    for i in [5, 20, 60]:
-        df[f"volatility{i}"] = df["day_change"].rolling(i).std()
-
-    return df
+    return add_indicators(df, [f"volatility{i}" for i in [5, 20, 60]])
 
 
 def add_norm_volume(df):
-    for i in [5, 10, 20]:
-        df[f"vol{i}"] = df["Volume"].rolling(i).mean() / df["Volume"]
-
-    return df
+    return add_indicators(df, [f"vol{i}" for i in [5, 10, 20]])
 
 
 def add_bollinger_band(df):
     if "ma20" not in df.columns:
-        df["ma20"] = df["Close"].rolling(20).mean()
-    std = df["Close"].rolling(20).std()
+        df = add_indicators(df, ["ma20"])
 
-    df["upper_bb"] = df["ma20"] + 2 * std
-    df["lower_bb"] = df["ma20"] - 2 * std
-
-    return df
+    return add_indicators(df, ["upper_bb", "lower_bb"])
 
 
 def add_macd(df):
-    ema12 = df["Close"].ewm(span=12).mean()
-    ema26 = df["Close"].ewm(span=26).mean()
-    macd = (ema12 - ema26) / ema26
-    macd_signal = macd.ewm(span=9).mean()
-
-    df["macd_hist"] = macd - macd_signal
-    df["macd_ma3"] = df["macd_hist"].rolling(3).mean()
-    df["macd_ma5"] = df["macd_hist"].rolling(5).mean()
-
-    for i in [1, 2, 3]:
-        df[f"macd_{i}d_diff"] = df["macd_hist"] - df["macd_hist"].shift(i)
+    names = ["macd_hist", "macd_ma3", "macd_ma5"]
+    names += [f"macd_{i}d_diff" for i in [1, 2, 3]]
 
-    return df
+    return add_indicators(df, names)
 
 
 def add_psar(df, af_step=0.02, af_max=0.2):
-    # Initialize columns
-    psar_array = np.zeros(len(df))
-    af_array = np.full(len(df), af_step)
-
-    # Initial values
-    bull = True
-    psar = df.iloc[0]["Low"]
-    ep = df.iloc[0]["High"]
-
-    for i in range(1, len(df)):
-        if bull:
-            psar = psar + af_array[i - 1] * (ep - psar)
-            if df.iloc[i]["Low"] < psar:
-                bull = False
-                psar = ep
-                ep = df.iloc[i]["Low"]
-                af_array[i] = af_step
-            else:
-                if df.iloc[i]["High"] > ep:
-                    ep = df.iloc[i]["High"]
-                    af_array[i] = min(af_array[i - 1] + af_step, af_max)
-                else:
-                    af_array[i] = af_array[i - 1]
-        else:
-            psar = psar - af_array[i - 1] * (psar - ep)
-            if df.iloc[i]["High"] > psar:
-                bull = True
-                psar = ep
-                ep = df.iloc[i]["High"]
-                af_array[i] = af_step
-            else:
-                if df.iloc[i]["Low"] < ep:
-                    ep = df.iloc[i]["Low"]
-                    af_array[i] = min(af_array[i - 1] + af_step, af_max)
-                else:
-                    af_array[i] = af_array[i - 1]
-
-        psar_array[i] = psar
-
-    psar_array[0] = df.iloc[0]["Close"]
-
-    df["psar"] = psar_array
+    df["psar"], _, _, _ = psar_arrays(
+        df["High"].to_numpy(),
+        df["Low"].to_numpy(),
+        df["Close"].to_numpy(),
+        af_step,
+        af_max,
+    )
 
     return df
 
 
 def add_stochastic_oscillator(df):
+    names = []
     for i in [7, 23]:
-        low = df["Low"].rolling(window=i).min()
-        high = df["High"].rolling(window=i).max()
-        df[f"os_k{i}"] = (df["Close"] - low) / (high - low)
-        df[f"os_d{i}"] = df[f"os_k{i}"].rolling(window=3).mean()
+        names += [f"os_k{i}", f"os_d{i}", f"os_kd{i}", f"os_kd{i}_1d", f"os_kd{i}_2d"]
 
-        df[f"os_kd{i}"] = df[f"os_k{i}"] - df[f"os_d{i}"]
-        df[f"os_kd{i}_1d"] = df[f"os_kd{i}"] - df[f"os_kd{i}"].shift(1)
-        df[f"os_kd{i}_2d"] = df[f"os_kd{i}"] - df[f"os_kd{i}"].shift(2)
-
-    return df
+    return add_indicators(df, names)
 
 
 def add_target(df):
@@ -152,23 +148,94 @@ def preprocess(stock_data):
     stock_data, target = add_target(stock_data)
     old_columns = stock_data.columns
 
-    # Un-normalized features
-    stock_data = add_moving_average(stock_data)
-    stock_data = add_bollinger_band(stock_data)
-    stock_data = add_psar(stock_data, af_step=0.02, af_max=0.2)
-
-    unnorm_features = list(set(stock_data.columns) - set(old_columns))
-    stock_data[unnorm_features] = stock_data[unnorm_features].div(
+    # Un-normalized features (moving averages, Bollinger bands, PSAR) in one pass
+    stock_data = add_indicators(stock_data, UNNORM_FEATURES)
+    stock_data[UNNORM_FEATURES] = stock_data[UNNORM_FEATURES].div(
         stock_data["Close"], axis=0
     )
 
-    # Normalized features
-    stock_data = add_macd(stock_data)
-    stock_data = add_norm_volume(stock_data)
-    stock_data = add_stochastic_oscillator(stock_data)
-    stock_data = add_volatility(stock_data)
+    # Normalized features (MACD, volume, stochastic oscillator, volatility), the
+    # volatility reads the day_change column divided by Close above
+    stock_data = add_indicators(stock_data, FEATURES[len(UNNORM_FEATURES) :])
 
-    train_features = list(set(stock_data.columns) - set(old_columns))
+    train_features = [col for col in stock_data.columns if col not in old_columns]
     stock_data = stock_data.dropna()
 
     return stock_data, train_features, target
+
+
+def load_panel(price_store, symbols=None) -> pd.DataFrame:
+    """Long format panel (Symbol, Date, OHLCV) of the histories kept in a PriceStore."""
+    frames = []
+    for symbol in symbols or price_store.symbols():
+        df = price_store.load(symbol)
+        if df.empty:
+            continue
+        df = df[["Open", "High", "Low", "Close", "Volume"]].rename_axis("Date")
+        frames.append(df.reset_index().assign(Symbol=symbol))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def build_feature_matrix(panel: pd.DataFrame) -> tuple[pd.DataFrame, np.ndarray]:
+    """preprocess() for a whole long format panel in one go.
+
+    Every feature is computed once over all tickers with grouped rolling/ewm
+    windows and written into a preallocated float32 matrix whose columns follow
+    FEATURES. Returns the kept (Symbol, Date) rows with their int8 targets, and
+    the matching feature matrix; rows are dropped as preprocess' dropna would.
+    """
+    panel = panel.sort_values(["Symbol", "Date"], kind="stable", ignore_index=True)
+    codes = panel["Symbol"].astype("category").cat.codes.to_numpy()
+    ops = PanelOps(codes)
+    close = panel["Close"].to_numpy(dtype=np.float64)
+
+    matrix = np.empty((len(panel), len(FEATURES)), dtype=np.float32)
+    n_unnorm = len(UNNORM_FEATURES)
+
+    # Un-normalized features, divided by Close like in preprocess
+    unnorm = compute_indicators(panel, UNNORM_FEATURES + ["ema3"], ops)
+    matrix[:, :n_unnorm] = unnorm[UNNORM_FEATURES].to_numpy() / close[:, None]
+
+    # Normalized features, the volatility reads the divided day_change as well
+    day_change = unnorm["day_change"].to_numpy() / close
+    compute_indicators(
+        panel.assign(day_change=day_change),
+        FEATURES[n_unnorm:],
+        ops,
+        out=matrix[:, n_unnorm:],
+    )
+
+    # Targets, binned as in add_target
+    ema3 = unnorm["ema3"].to_numpy()
+    targets = {}
+    for name, shift in [("short_target", 2), ("long_target", 10)]:
+        change = (ops.group(ema3).shift(-shift).to_numpy() - close) / close
+        binned = (change >= -0.03).astype(np.int8) + (change >= 0.03)
+        targets[name] = np.where((change >= -1) & (change < 1), binned, -1)
+
+    keep = ~np.isnan(matrix).any(axis=1)
+    keep &= (
+        panel[["Open", "High", "Low", "Close", "Volume"]].notna().all(axis=1).to_numpy()
+    )
+    for name in TARGETS:
+        keep &= targets[name] >= 0
+
+    rows = panel.loc[keep, ["Symbol", "Date"]].reset_index(drop=True)
+    for name in TARGETS:
+        rows[name] = targets[name][keep].astype(np.int8)
+
+    return rows, matrix[keep]
+
+
+def write_training_set(panel: pd.DataFrame, path: str):
+    """Write Symbol, Date, FEATURES (float32) and TARGETS (int8) to one Parquet file."""
+    rows, matrix = build_feature_matrix(panel)
+    features = pd.DataFrame(matrix, columns=FEATURES, copy=False)
+    training_set = pd.concat(
+        [rows[["Symbol", "Date"]], features, rows[TARGETS]], axis=1
+    )
+
+    tmp_path = f"{path}.tmp"
+    training_set.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
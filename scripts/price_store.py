@@ -0,0 +1,219 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from scripts.incremental import ExtremaState, IndicatorState
+
+
+class PriceStore:
+    """Full OHLCV history per symbol on disk (one Parquet file each), topped up with deltas."""
+
+    def __init__(self, folder: str = "price_data"):
+        self.folder = folder
+        os.makedirs(self.folder, exist_ok=True)
+
+    def path(self, symbol: str) -> str:
+        return f"{self.folder}/{symbol}.parquet"
+
+    def symbols(self) -> list:
+        return sorted(
+            name[: -len(".parquet")]
+            for name in os.listdir(self.folder)
+            if name.endswith(".parquet") and not name.endswith(".indicators.parquet")
+        )
+
+    def load(self, symbol: str) -> pd.DataFrame:
+        if not os.path.exists(self.path(symbol)):
+            return pd.DataFrame()
+        return pd.read_parquet(self.path(symbol))
+
+    def save(self, symbol: str, df: pd.DataFrame):
+        # Write next to the target and swap, so readers never see half a file
+        tmp_path = f"{self.path(symbol)}.tmp"
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, self.path(symbol))
+
+    def update(self, symbol: str, ticker_object) -> pd.DataFrame:
+        """Fetch only the bars after the last stored one and append them."""
+        stored = self.load(symbol)
+        if stored.empty:
+            df = ticker_object.history(period="max")
+            self.save(symbol, df)
+            self.reset_indicators(symbol)
+            return df
+
+        # Re-fetch the last stored bar as well, it may have been a partial day
+        last_date = stored.index[-1].strftime("%Y-%m-%d")
+        new_bars = ticker_object.history(start=last_date)
+        if new_bars.empty:
+            return stored
+
+        # Prices are dividend/split adjusted, so a corporate action rewrites the
+        # past; the re-fetched last bar is already adjusted for its own action
+        actions = [col for col in ["Dividends", "Stock Splits"] if col in new_bars]
+        after_last = new_bars[new_bars.index > stored.index[-1]]
+        if (after_last[actions] != 0).any().any():
+            df = ticker_object.history(period="max")
+            self.save(symbol, df)
+            self.reset_indicators(symbol)
+            return df
+
+        df = pd.concat([stored[stored.index < new_bars.index[0]], new_bars])
+        df = df[~df.index.duplicated(keep="last")]
+        self.save(symbol, df)
+
+        return df
+
+    def indicators(self, symbol: str, prices: pd.DataFrame = None) -> pd.DataFrame:
+        """Indicator columns over the full stored history, only new bars are computed.
+
+        Seeded from the first stored bar, so they differ from PlotInfo's early
+        window values; pages, the screener and the backtests all recompute
+        their window. prices can hand in the stored history when it is
+        already loaded.
+        """
+        state_path = f"{self.folder}/{symbol}.state.json"
+        indicator_path = f"{self.folder}/{symbol}.indicators.parquet"
+        if prices is None:
+            prices = self.load(symbol)
+
+        if os.path.exists(state_path) and os.path.exists(indicator_path):
+            state = IndicatorState.load(state_path)
+            stored = pd.read_parquet(indicator_path)
+        else:
+            state = IndicatorState()
+            stored = pd.DataFrame()
+
+        if state.last_date is not None and state.last_date not in prices.index:
+            self.reset_indicators(symbol)
+            return self.indicators(symbol, prices)
+
+        new_rows = state.update(prices)
+        if new_rows.empty:
+            return stored
+
+        if stored.empty:
+            df = new_rows
+        else:
+            df = pd.concat([stored[stored.index < new_rows.index[0]], new_rows])
+
+        tmp_path = f"{indicator_path}.tmp"
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, indicator_path)
+        state.save(state_path)
+
+        return df
+
+    def extrema(
+        self, symbol: str, prices: pd.DataFrame = None, order: int = 4
+    ) -> ExtremaState:
+        """Peaks and troughs over the stored history, only new bars are scanned.
+
+        prices can hand in the stored history when it is already loaded.
+        """
+        state_path = f"{self.folder}/{symbol}.extrema{order}.json"
+        if prices is None:
+            prices = self.load(symbol)
+
+        if os.path.exists(state_path):
+            state = ExtremaState.load(state_path)
+        else:
+            state = ExtremaState(order)
+
+        if state.last_date is not None and state.last_date not in prices.index:
+            os.remove(state_path)
+            return self.extrema(symbol, prices, order)
+
+        if state.update(prices):
+            state.save(state_path)
+
+        return state
+
+    def reset_indicators(self, symbol: str):
+        for name in os.listdir(self.folder):
+            if name in [f"{symbol}.state.json", f"{symbol}.indicators.parquet"] or (
+                name.startswith(f"{symbol}.extrema") and name.endswith(".json")
+            ):
+                os.remove(f"{self.folder}/{name}")
+
+    def history(self, symbol: str, period: str, ticker_object=None) -> pd.DataFrame:
+        """Serve a yfinance style period (e.g. "250d", "6mo", "1y") from disk.
+
+        If a ticker object is given the store is topped up first, otherwise the
+        stored bars are used as they are (offline rebuilds).
+        """
+        if ticker_object is not None:
+            df = self.update(symbol, ticker_object)
+        else:
+            df = self.load(symbol)
+
+        return trailing_window(df, period)
+
+    def window_arrays(self, symbol: str, period: str, columns: list) -> dict:
+        """The stored bars of history(symbol, period) as numpy arrays per column.
+
+        Read straight from the Parquet file without building a DataFrame, for
+        screens over many symbols; "Date" holds the bar dates as an index.
+        Empty when nothing is stored.
+        """
+        if not os.path.exists(self.path(symbol)):
+            return {}
+        table = pq.read_table(self.path(symbol))
+        if table.num_rows == 0:
+            return {}
+
+        date_column = table.schema.pandas_metadata["index_columns"][0]
+        dates = pd.DatetimeIndex(table.column(date_column).to_pandas())
+        start = window_start(dates, period)
+
+        arrays = {
+            col: table.column(col).to_numpy()[start:].astype(np.float64)
+            for col in columns
+        }
+        arrays["Date"] = dates[start:]
+
+        return arrays
+
+
+def trailing_window(df: pd.DataFrame, period: str) -> pd.DataFrame:
+    """The bars of a yfinance style period, counted back from the last one."""
+    if df.empty or period == "max":
+        return df
+
+    return df.iloc[window_start(df.index, period) :].copy()
+
+
+def window_start(dates: pd.DatetimeIndex, period: str) -> int:
+    """Position of the first bar of a yfinance style period ending at the last date.
+
+    yfinance counts "<N>d" in trading days, so it is the last N bars, as
+    history(period="250d") returned; weeks, months and years are calendar spans.
+    """
+    if period == "max" or len(dates) == 0:
+        return 0
+
+    match = re.fullmatch(r"(\d+)d", period)
+    if match is not None:
+        return max(len(dates) - int(match[1]), 0)
+
+    cutoff = dates[-1] - period_to_offset(period)
+    return int(dates.searchsorted(cutoff, side="right"))
+
+
+def period_to_offset(period: str) -> pd.DateOffset:
+    """Turn a yfinance period string into a calendar offset."""
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if match is None:
+        raise ValueError(f"Unsupported period: {period}")
+
+    amount, unit = int(match[1]), match[2]
+    if unit == "d":
+        return pd.DateOffset(days=amount)
+    if unit == "wk":
+        return pd.DateOffset(weeks=amount)
+    if unit == "mo":
+        return pd.DateOffset(months=amount)
+    return pd.DateOffset(years=amount)
@@ -0,0 +1,208 @@
+import json
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Per process switches, set by configure() (build workers get them through
+# the pool initializer)
+settings = {"enabled": False, "trace_memory": False}
+
+# Records of this process, and the per thread span stack and collectors
+records = []
+local = threading.local()
+
+
+def configure(enabled: bool = True, trace_memory: bool = False):
+    settings["enabled"] = enabled
+    settings["trace_memory"] = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def emit(record: dict):
+    sinks = getattr(local, "sinks", None)
+    (sinks[-1] if sinks else records).append(record)
+
+
+@contextmanager
+def span(stage: str, ticker: str = None, **fields):
+    """Time a stage; nested spans are reported as parent/child."""
+    if not settings["enabled"]:
+        yield
+        return
+
+    stack = local.__dict__.setdefault("stack", [])
+    stack.append(stage)
+    path = "/".join(stack)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stack.pop()
+        emit(
+            {
+                "type": "span",
+                "stage": path,
+                "ticker": ticker,
+                "seconds": time.perf_counter() - start,
+                **fields,
+            }
+        )
+
+
+def network(kind: str, ticker: str, seconds: float, value=None):
+    """One download: its kind (history, option_chain, ...), time and payload size."""
+    if settings["enabled"]:
+        emit(
+            {
+                "type": "network",
+                "kind": kind,
+                "ticker": ticker,
+                "seconds": seconds,
+                "bytes": payload_bytes(value),
+            }
+        )
+
+
+def payload_bytes(value) -> int:
+    """In-memory size of a downloaded object, as a stand in for the bytes received."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, tuple) and all(
+        isinstance(item, pd.DataFrame) for item in value
+    ):
+        return sum(payload_bytes(item) for item in value)
+    if isinstance(value, (list, tuple)):
+        return sum(len(str(item)) for item in value)
+    return 0
+
+
+@contextmanager
+def ticker_memory(ticker: str):
+    """Peak Python heap while the block runs, when memory tracing is on."""
+    if not (settings["enabled"] and settings["trace_memory"]):
+        yield
+        return
+
+    tracemalloc.reset_peak()
+    start = tracemalloc.get_traced_memory()[0]
+    try:
+        yield
+    finally:
+        emit(
+            {
+                "type": "memory",
+                "ticker": ticker,
+                "peak_bytes": tracemalloc.get_traced_memory()[1] - start,
+            }
+        )
+
+
+@contextmanager
+def collect():
+    """Gather the records of the block in a list instead of the process' records.
+
+    Build workers hand these back with their results, so the parent sees the
+    spans of every process.
+    """
+    collected = []
+    sinks = local.__dict__.setdefault("sinks", [])
+    sinks.append(collected)
+    try:
+        yield collected
+    finally:
+        sinks.pop()
+
+
+def add(new_records: list):
+    records.extend(new_records)
+
+
+def write_report(path: str, run_info: dict = None):
+    """The run as JSON lines: a run record first, then every span/network/memory record."""
+    with open(path, "w") as f:
+        f.write(json.dumps({"type": "run", **(run_info or {})}) + "\n")
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def summary(top: int = 5) -> str:
+    """Text table of the slowest tickers and stages, downloads and memory peaks."""
+    stage_time = defaultdict(float)
+    stage_count = defaultdict(int)
+    ticker_time = defaultdict(float)
+    network_stats = defaultdict(lambda: [0, 0.0, 0])
+    peaks = {}
+    for record in records:
+        if record["type"] == "span":
+            stage_time[record["stage"]] += record["seconds"]
+            stage_count[record["stage"]] += 1
+            if record["ticker"] and "/" not in record["stage"]:
+                ticker_time[record["ticker"]] += record["seconds"]
+        elif record["type"] == "network":
+            stat = network_stats[record["kind"]]
+            stat[0] += 1
+            stat[1] += record["seconds"]
+            stat[2] += record["bytes"]
+        elif record["type"] == "memory":
+            peaks[record["ticker"]] = max(
+                peaks.get(record["ticker"], 0), record["peak_bytes"]
+            )
+
+    lines = ["Slowest stages (total over tickers):"]
+    for stage, seconds in sorted(stage_time.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"  {stage:<32} {seconds:8.2f}s  x{stage_count[stage]}")
+
+    lines.append("Slowest tickers (fetch + build):")
+    for ticker, seconds in sorted(ticker_time.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"  {ticker:<32} {seconds:8.2f}s")
+
+    lines.append("Downloads:")
+    for kind, (calls, seconds, size) in sorted(network_stats.items()):
+        lines.append(
+            f"  {kind:<32} {calls:5d} calls {seconds:8.2f}s {size / 1e6:8.1f} MB"
+        )
+
+    if peaks:
+        lines.append("Peak memory per ticker:")
+        for ticker, peak in sorted(peaks.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  {ticker:<32} {peak / 1e6:8.1f} MB")
+
+    return "\n".join(lines)
+
+
+def start_profiler(kind: str):
+    """Start a whole-run "cprofile" or "pyinstrument" profiler (None: no profiler)."""
+    if kind == "cprofile":
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    if kind == "pyinstrument":
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+    return None
+
+
+def stop_profiler(profiler, path_prefix: str) -> str:
+    """Stop it and dump to <path_prefix>.prof (cProfile) or .html (pyinstrument)."""
+    if profiler is None:
+        return None
+    if hasattr(profiler, "dump_stats"):
+        profiler.disable()
+        path = f"{path_prefix}.prof"
+        profiler.dump_stats(path)
+    else:
+        profiler.stop()
+        path = f"{path_prefix}.html"
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+    return path
@@ -0,0 +1,146 @@
+import json
+import os
+import shutil
+from datetime import datetime
+
+from scripts.site_index import ENCODINGS, MANIFEST, served_files, write_manifest
+
+
+def new_build(root: str = "builds") -> str:
+    """Empty, uniquely named build folder (<root>/<timestamp>) to render a site into."""
+    name = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(root, name)
+    suffix = 1
+    while os.path.exists(path):
+        suffix += 1
+        path = os.path.join(root, f"{name}-{suffix}")
+    os.makedirs(path)
+
+    return path
+
+
+def fsync_tree(folder: str):
+    """Flush every file of a finished build to disk before it is published."""
+    for root, _, names in os.walk(folder):
+        for name in names:
+            fd = os.open(os.path.join(root, name), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        fsync_dir(root)
+
+
+def fsync_dir(folder: str):
+    # Makes the renames inside folder durable, not supported on every platform
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def replace_file(src: str, dst: str):
+    """Copy src over dst so readers see either the old or the whole new file."""
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    tmp_path = f"{dst}.tmp"
+    shutil.copyfile(src, tmp_path)
+    fd = os.open(tmp_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, dst)
+
+
+def publish_folder(build_folder: str, target_folder: str, overwrite=True):
+    """Swap the files of a built folder into a served one.
+
+    Figure files go first and pages after them, so a new page never asks for
+    a figure that is not there yet; the manifest goes last, as the server
+    reloads when it changes. Figures live under fig/<build>/ and figure bases
+    are named by hash, so pages still open in a browser keep loading the
+    figures they were built with: the files of the previous build (as listed
+    by the manifest being replaced) stay, older figure files are removed once
+    the new pages are in place.
+    """
+    previous = set(manifest_files(target_folder))
+    paths = served_files(build_folder)
+    paths.sort(key=lambda path: not path.startswith("fig/"))
+    if os.path.exists(os.path.join(build_folder, MANIFEST)):
+        paths.append(MANIFEST)
+
+    for path in paths:
+        dst = os.path.join(target_folder, path)
+        if not overwrite and os.path.exists(dst):
+            continue
+        # Compressed siblings first, the plain file is what the server indexes
+        for suffix in ENCODINGS.values():
+            if os.path.exists(os.path.join(build_folder, path + suffix)):
+                replace_file(os.path.join(build_folder, path + suffix), dst + suffix)
+        replace_file(os.path.join(build_folder, path), dst)
+
+    keep = previous | set(paths)
+    fig_folder = os.path.join(target_folder, "fig")
+    for path in served_files(fig_folder) if os.path.isdir(fig_folder) else []:
+        if f"fig/{path}" not in keep:
+            stale = os.path.join(fig_folder, path)
+            for suffix in ["", *ENCODINGS.values()]:
+                if os.path.exists(stale + suffix):
+                    os.remove(stale + suffix)
+
+    for root, _, _ in os.walk(fig_folder, topdown=False):
+        if root != fig_folder and not os.listdir(root):
+            os.rmdir(root)
+
+    for root, _, _ in os.walk(target_folder):
+        fsync_dir(root)
+
+
+def manifest_files(folder: str) -> list:
+    """Paths listed in a served folder's manifest, empty when there is none."""
+    path = os.path.join(folder, MANIFEST)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return list(json.load(f).get("files", {}))
+
+
+def publish(build_dir: str, vendor_dir: str, targets: list):
+    """Copy one build to every site root: static_html/ and static/vendor/ under each.
+
+    Vendored files are versioned by name, so existing ones are left alone; the
+    vendor folder's manifest is rewritten so a running server picks up new
+    ones. Site roots that do not exist on this machine are skipped.
+    """
+    fsync_tree(build_dir)
+    published = []
+    for target in targets:
+        if not os.path.isdir(target):
+            print(f"Skipping {target}: no such site root")
+            continue
+        target_vendor = os.path.join(target, "static", "vendor")
+        publish_folder(vendor_dir, target_vendor, overwrite=False)
+        write_manifest(target_vendor)
+        publish_folder(
+            os.path.join(build_dir, "static_html"), os.path.join(target, "static_html")
+        )
+        published.append(target)
+
+    return published
+
+
+def prune_builds(root: str = "builds", keep: int = 3):
+    """Remove all but the newest keep builds."""
+    if not os.path.isdir(root):
+        return
+    builds = sorted(
+        name for name in os.listdir(root) if name[:1].isdigit() and "-" in name
+    )
+    for name in builds[:-keep] if keep else builds:
+        shutil.rmtree(os.path.join(root, name))
@@ -0,0 +1,242 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.signal import argrelmax, argrelmin
+
+from scripts.backtest import indicator_panel, panel_signals
+from scripts.price_store import PriceStore
+from scripts.stock_analysis import clean_sorted_extrema
+
+FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+
+# Symbols per worker task, each task is one vectorized panel
+CHUNK_SIZE = 100
+
+
+def load_window(price_store: PriceStore, symbols: list, period: str) -> tuple:
+    """The PlotInfo window of every symbol as right aligned (bars x symbols) frames.
+
+    Row -1 is each symbol's last stored bar; shorter histories are NaN padded
+    at the top, so windows never have gaps where calendars differ and rolling
+    or ewm values match the ones of the symbol's own series. Returns the
+    frames per field and the last date of each symbol.
+    """
+    histories = {}
+    for symbol in symbols:
+        arrays = price_store.window_arrays(symbol, period, FIELDS)
+        if arrays and len(arrays["Date"]):
+            histories[symbol] = arrays
+
+    if not histories:
+        return {}, {}
+
+    bars = max(len(arrays["Date"]) for arrays in histories.values())
+    frames = {}
+    for field in FIELDS:
+        values = np.full((bars, len(histories)), np.nan)
+        for col, arrays in enumerate(histories.values()):
+            values[bars - len(arrays[field]) :, col] = arrays[field]
+        frames[field] = pd.DataFrame(values, columns=list(histories))
+    last_dates = {
+        symbol: arrays["Date"][-1].strftime("%Y-%m-%d")
+        for symbol, arrays in histories.items()
+    }
+
+    return frames, last_dates
+
+
+def bars_since(flags: np.ndarray) -> np.ndarray:
+    """Bars since the last True of each column at the last row (NaN if never)."""
+    flags = np.asarray(flags, dtype=bool)
+    last = len(flags) - 1 - np.argmax(flags[::-1], axis=0)
+    return np.where(flags.any(axis=0), len(flags) - 1 - last, np.nan)
+
+
+def last_extrema(high: np.ndarray, low: np.ndarray, order: int = 4) -> dict:
+    """Latest cleaned peak or trough of every column, as get_extrema_for_plot finds them.
+
+    Returns per column the kind (1 peak, 0 trough, NaN none), its row and value.
+    """
+    n_bars, n_cols = high.shape
+    kind = np.full(n_cols, np.nan)
+    row = np.full(n_cols, np.nan)
+    value = np.full(n_cols, np.nan)
+    for col in range(n_cols):
+        # Search only the listed span, so the edges are clipped as for one ticker
+        valid = np.flatnonzero(~np.isnan(high[:, col]))
+        if len(valid) == 0:
+            continue
+        start = valid[0]
+        max_idx = argrelmax(high[start:, col], order=order)[0] + start
+        min_idx = argrelmin(low[start:, col], order=order)[0] + start
+
+        merged_idx = np.concatenate((max_idx, min_idx))
+        if len(merged_idx) == 0:
+            continue
+        merged_val = np.concatenate((high[max_idx, col], low[min_idx, col]))
+        merged_type = np.concatenate(([1] * len(max_idx), [0] * len(min_idx)))
+        stacked_array = np.vstack((merged_idx, merged_val, merged_type))
+        sorted_extrema = clean_sorted_extrema(
+            stacked_array[:, stacked_array[0].argsort()]
+        )
+        row[col], value[col], kind[col] = sorted_extrema[:, -1]
+
+    return {"kind": kind, "row": row, "value": value}
+
+
+def screen_symbols(
+    folder: str, symbols: list, period: str = "250d", order: int = 4
+) -> pd.DataFrame:
+    """Signals of PlotInfo at the last bar of each symbol, one vectorized panel.
+
+    MACD bullish / enhanced / weaken and PSAR as in add_macd_analysis and
+    add_psar, Bollinger %B of add_ma_analysis, and the latest peak or trough
+    of add_min_max_analysis (searched in the window).
+    """
+    frames, last_dates = load_window(PriceStore(folder), symbols, period)
+    if not frames:
+        return pd.DataFrame()
+
+    high, low, close = frames["High"], frames["Low"], frames["Close"]
+    indicators = indicator_panel(high, low, close)
+    signals = panel_signals(indicators)
+    psar_diff = indicators["psar_diff"].to_numpy()
+    psar_up = psar_diff > 0
+    flipped = (psar_up != psar_up[-1]) & ~np.isnan(psar_diff)
+
+    ma20 = close.rolling(20).mean().to_numpy()
+    std20 = close.rolling(20).std().to_numpy()
+    close = close.to_numpy()
+    high = high.to_numpy()
+    low = low.to_numpy()
+    last_close = close[-1]
+    extrema = last_extrema(high, low, order)
+
+    # 20 bars back, or the first bar of shorter windows
+    first = np.argmax(~np.isnan(close), axis=0)
+    back = np.maximum(len(close) - 21, first)
+    past_close = close[back, np.arange(close.shape[1])]
+
+    table = pd.DataFrame(
+        {
+            "symbol": list(frames["Close"].columns),
+            "date": list(last_dates.values()),
+            "close": last_close,
+            "chg_20d": 100 * (last_close / past_close - 1),
+            "bull": signals["bull_idx"][-1],
+            "macd_up": signals["macd_up_idx"][-1],
+            "macd_down": signals["macd_down_idx"][-1],
+            "bull_days": bars_since(signals["bull_idx"]),
+            "macd_hist": indicators["macd_hist"].to_numpy()[-1],
+            "psar_diff": 100 * psar_diff[-1],
+            "psar_days": bars_since(flipped),
+            "bb_pct": (last_close - (ma20[-1] - 2 * std20[-1])) / (4 * std20[-1]),
+            "extremum": np.where(
+                extrema["kind"] == 1,
+                "peak",
+                np.where(extrema["kind"] == 0, "trough", ""),
+            ),
+            "extremum_days": len(close) - 1 - extrema["row"],
+            "from_extremum": 100 * (last_close / extrema["value"] - 1),
+        }
+    )
+
+    # One point per bullish reading: MACD bullish / enhanced, PSAR below the
+    # price and a trough as the latest swing; MACD weaken takes one away
+    table["score"] = (
+        table["bull"].astype(int)
+        + table["macd_up"]
+        - table["macd_down"]
+        + psar_up[-1]
+        + (table["extremum"] == "trough")
+    )
+
+    return table
+
+
+def screen(
+    symbols: list = None,
+    folder: str = "price_data",
+    period: str = "250d",
+    order: int = 4,
+    workers: int = None,
+    rank_by: str = "score",
+    ascending: bool = False,
+) -> pd.DataFrame:
+    """Rank a universe of stored symbols on the PlotInfo signals, without figures.
+
+    The symbols are split in chunks of CHUNK_SIZE, each loaded and computed as
+    one panel in a worker process (workers=0 runs them in this process).
+    """
+    symbols = list(symbols or PriceStore(folder).symbols())
+    chunks = [
+        symbols[start : start + CHUNK_SIZE]
+        for start in range(0, len(symbols), CHUNK_SIZE)
+    ]
+
+    args = ([folder] * len(chunks), chunks, [period] * len(chunks))
+    if workers == 0 or len(chunks) < 2:
+        tables = list(map(screen_symbols, *args, [order] * len(chunks)))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            tables = list(pool.map(screen_symbols, *args, [order] * len(chunks)))
+
+    tables = [table for table in tables if not table.empty]
+    if not tables:
+        return pd.DataFrame()
+
+    # Ties keep the better PSAR trend first
+    table = pd.concat(tables, ignore_index=True)
+    table = table.sort_values(
+        [rank_by, "psar_diff"], ascending=[ascending, False], kind="stable"
+    )
+    table.insert(0, "rank", range(1, len(table) + 1))
+
+    return table.reset_index(drop=True)
+
+
+def read_universe(path: str) -> list:
+    """Symbols of a text file, one per line or separated by spaces/commas."""
+    with open(path, "r") as f:
+        text = f.read()
+    return [symbol for symbol in text.replace(",", " ").split() if symbol]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank stored symbols by signals")
+    parser.add_argument("symbols", nargs="*", help="default: every stored symbol")
+    parser.add_argument("--universe", help="text file with the symbols to screen")
+    parser.add_argument("--store", default="price_data", help="PriceStore folder")
+    parser.add_argument("--period", default="250d", help="window, as on the pages")
+    parser.add_argument("--order", type=int, default=4, help="extrema order")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--rank-by", default="score")
+    parser.add_argument("--ascending", action="store_true")
+    parser.add_argument("--top", type=int, default=30, help="rows to print")
+    parser.add_argument("--out", help="write the whole table to this CSV file")
+    args = parser.parse_args()
+
+    symbols = args.symbols
+    if args.universe:
+        symbols = symbols + read_universe(args.universe)
+
+    start = time.perf_counter()
+    table = screen(
+        symbols,
+        args.store,
+        args.period,
+        args.order,
+        args.workers,
+        args.rank_by,
+        args.ascending,
+    )
+    elapsed = time.perf_counter() - start
+
+    if args.out:
+        table.to_csv(args.out, index=False)
+    print(table.head(args.top).to_string(index=False, float_format="%.2f"))
+    print(f"Screened {len(table)} symbols in {elapsed:.1f}s")
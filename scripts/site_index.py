@@ -0,0 +1,150 @@
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+MANIFEST = "manifest.json"
+
+# Precompressed siblings written by page_output.write_compressed
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+# Past the scheduled rebuild, clients revalidate this often until it lands
+MIN_MAX_AGE = 60
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:20]
+
+
+def next_build_time(now: datetime, hour: int) -> datetime:
+    """Next daily rebuild at hour (UTC) after now."""
+    now = now.astimezone(timezone.utc)
+    build = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if build <= now:
+        build += timedelta(days=1)
+    return build
+
+
+def write_manifest(folder: str, next_build: datetime = None):
+    """Hash every served file of a build once and record when the next build is due.
+
+    The server reads this at startup instead of hashing or stat-ing files per
+    request; the hash of a page is its ETag.
+    """
+    files = {}
+    for path in served_files(folder):
+        with open(os.path.join(folder, path), "rb") as f:
+            files[path] = content_hash(f.read())
+
+    manifest = {
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "next_build": next_build.isoformat() if next_build else None,
+        "files": files,
+    }
+    tmp_path = os.path.join(folder, f"{MANIFEST}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, os.path.join(folder, MANIFEST))
+
+
+def served_files(folder: str) -> list:
+    """Paths relative to folder (with / separators), without compressed siblings."""
+    paths = []
+    for root, _, names in os.walk(folder):
+        for name in names:
+            path = os.path.relpath(os.path.join(root, name), folder)
+            path = path.replace(os.sep, "/")
+            if path == MANIFEST or path.endswith((".tmp", *ENCODINGS.values())):
+                continue
+            paths.append(path)
+    return sorted(paths)
+
+
+class IndexEntry:
+    def __init__(self, etag: str, mimetype: str, variants: dict):
+        self.etag = etag
+        self.mimetype = mimetype
+        # Content-Encoding (None for identity) -> body
+        self.variants = variants
+
+
+class SiteIndex:
+    """Every file of a served folder held in memory with its ETag and encodings.
+
+    Built once at startup from the build's manifest (files missing from it are
+    hashed then). The manifest's modification time is checked at most every
+    refresh_interval seconds, and the whole index is swapped when a new build
+    has been published. max_age pins a fixed Cache-Control lifetime (vendored
+    files); otherwise responses live until the manifest's next_build.
+    """
+
+    def __init__(self, folder: str, max_age: int = None, refresh_interval=60):
+        self.folder = folder
+        self.fixed_max_age = max_age
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.next_build = None
+        self.manifest_mtime = None
+        self.checked = 0.0
+        self.load()
+
+    def manifest_path(self) -> str:
+        return os.path.join(self.folder, MANIFEST)
+
+    def load(self):
+        manifest = {}
+        mtime = None
+        if os.path.exists(self.manifest_path()):
+            mtime = os.path.getmtime(self.manifest_path())
+            with open(self.manifest_path(), "r") as f:
+                manifest = json.load(f)
+
+        entries = {}
+        hashes = manifest.get("files", {})
+        for path in served_files(self.folder) if os.path.isdir(self.folder) else []:
+            full_path = os.path.join(self.folder, path)
+            with open(full_path, "rb") as f:
+                variants = {None: f.read()}
+            for encoding, suffix in ENCODINGS.items():
+                if os.path.exists(full_path + suffix):
+                    with open(full_path + suffix, "rb") as f:
+                        variants[encoding] = f.read()
+
+            mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            etag = hashes.get(path) or content_hash(variants[None])
+            entries[path] = IndexEntry(etag, mimetype, variants)
+
+        next_build = manifest.get("next_build")
+        self.entries = entries
+        self.next_build = datetime.fromisoformat(next_build) if next_build else None
+        self.manifest_mtime = mtime
+        self.checked = time.monotonic()
+
+    def refresh(self):
+        """Reload if a new build was published since the last check."""
+        if time.monotonic() - self.checked < self.refresh_interval:
+            return
+        with self.lock:
+            if time.monotonic() - self.checked < self.refresh_interval:
+                return
+            self.checked = time.monotonic()
+            path = self.manifest_path()
+            mtime = os.path.getmtime(path) if os.path.exists(path) else None
+            if mtime != self.manifest_mtime:
+                self.load()
+
+    def get(self, path: str) -> IndexEntry:
+        self.refresh()
+        return self.entries.get(path)
+
+    def max_age(self) -> int:
+        if self.fixed_max_age is not None:
+            return self.fixed_max_age
+        if self.next_build is None:
+            return 0
+        remaining = (self.next_build - datetime.now(timezone.utc)).total_seconds()
+        return max(int(remaining), MIN_MAX_AGE)
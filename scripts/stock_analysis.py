@@ -21,34 +21,65 @@ def merge_extrema_idx_with_val(
     return sorted_extrema
 
 
+def clean_sorted_extrema(
+    sorted_extrema: np.ndarray, groups: np.ndarray = None
+) -> np.ndarray:
+    """Collapse runs of the same extrema type into the highest max / lowest min.
+
+    groups optionally labels each extremum (e.g. its ticker column) when the
+    extrema of several series are stacked one after the other; runs never
+    cross from one group to the next.
+    """
+    if sorted_extrema.shape[1] == 0:
+        return sorted_extrema
+
+    idx_type = sorted_extrema[2]
+    breaks = idx_type[1:] != idx_type[:-1]
+    if groups is not None:
+        breaks |= groups[1:] != groups[:-1]
+    run = np.concatenate(([0], np.cumsum(breaks)))
+
+    # Keep the best value of each run, ties go to the later extremum
+    key = np.where(idx_type == 1, sorted_extrema[1], -sorted_extrema[1])
+    starts = np.flatnonzero(np.concatenate(([True], run[1:] != run[:-1])))
+    best = np.flatnonzero(key == np.maximum.reduceat(key, starts)[run])
+    last_in_run = np.append(run[best][1:] != run[best][:-1], True)
+
+    return sorted_extrema[:, best[last_in_run]]
+
+
+def split_extrema_idx(sorted_extrema: np.ndarray) -> tuple[list, list]:
+    """Split merged extrema back into max and min index lists."""
+    idx = sorted_extrema[0].astype(int)
+    is_max = sorted_extrema[2] == 1
+
+    return idx[is_max].tolist(), idx[~is_max].tolist()
+
+
+def eval_sorted_extrema(sorted_extrema: np.ndarray) -> tuple[list, list]:
+    """Percentage swing of every extremum from the previous one."""
+    if sorted_extrema.shape[1] == 0:
+        return [], []
+
+    val = sorted_extrema[1]
+    evals = np.round(((val[1:] - val[:-1]) / val[:-1]) * 100, 1)
+
+    # The first extremum has nothing to compare with
+    max_eval = [0] if sorted_extrema[2, 0] == 1 else []
+    min_eval = [0] if sorted_extrema[2, 0] == 0 else []
+    max_eval += evals[evals > 0].tolist()
+    min_eval += evals[evals <= 0].tolist()
+
+    return max_eval, min_eval
+
+
 def clean_extrema_idx(
     max_idx: list, min_idx: list, stock_data: pd.DataFrame
 ) -> tuple[list, list]:
     """Confirm that there are no consecutive minimums or maximums."""
     sorted_extrema = merge_extrema_idx_with_val(max_idx, min_idx, stock_data)
 
-    prev = sorted_extrema[:, 0]
-    clean_max_idx = []
-    clean_min_idx = []
-
-    for i in range(1, len(sorted_extrema[0])):
-        curr = sorted_extrema[:, i]
-        if curr[2] != prev[2]:
-            idx = int(prev[0])
-            clean_max_idx.append(idx) if prev[2] == 1 else clean_min_idx.append(idx)
-            prev = curr
-        # multi max
-        elif curr[2] == 1:
-            prev = prev if prev[1] > curr[1] else curr
-        # multi min
-        elif curr[2] == 0:
-            prev = prev if prev[1] < curr[1] else curr
-
-    # Add the final "prev" as it must be valid
-    idx = int(prev[0])
-    clean_max_idx.append(idx) if prev[2] == 1 else clean_min_idx.append(idx)
-
-    return clean_max_idx, clean_min_idx
+    return split_extrema_idx(clean_sorted_extrema(sorted_extrema))
 
 
 def eval_max_min(
@@ -57,29 +88,33 @@ def eval_max_min(
     """Evaluate the percentages of min/max difference from previous extremes"""
     sorted_extrema = merge_extrema_idx_with_val(max_idx, min_idx, stock_data)
 
-    prev = sorted_extrema[:, 0]
-    max_eval = []
-    min_eval = []
-    # Initialize the first local max or min
-    max_eval.append(0) if prev[2] == 1 else min_eval.append(0)
+    return eval_sorted_extrema(sorted_extrema)
 
-    for i in range(1, len(sorted_extrema[0])):
-        curr = sorted_extrema[:, i]
-        eval = round((((curr[1] - prev[1]) / prev[1])) * 100, 1)
-        max_eval.append(eval) if eval > 0 else min_eval.append(eval)
-        prev = curr
 
-    return max_eval, min_eval
+def get_extrema_for_plot(
+    order: int, stock: pd.DataFrame, raw_idx: tuple = None
+) -> tuple[list, list, list, list]:
+    """Cleaned extrema indexes and their evaluations from a single merge
 
+    raw_idx can hand in the argrelmax/argrelmin indexes when already known.
+    """
+    if raw_idx is None:
+        max_idx = argrelmax(stock["High"].values, order=order)[0]
+        min_idx = argrelmin(stock["Low"].values, order=order)[0]
+    else:
+        max_idx, min_idx = raw_idx
 
-def get_extrema_idx_for_plot(order: int, stock: pd.DataFrame) -> tuple[list, list]:
-    """Remove duplicate extrema indexes for plotting purpose"""
-    max_idx = argrelmax(stock["High"].values, order=order)[0]
-    min_idx = argrelmin(stock["Low"].values, order=order)[0]
+    sorted_extrema = clean_sorted_extrema(
+        merge_extrema_idx_with_val(max_idx, min_idx, stock)
+    )
+    max_idx, min_idx = split_extrema_idx(sorted_extrema)
 
-    max_idx, min_idx = clean_extrema_idx(max_idx, min_idx, stock)
+    # Regroup as merging the cleaned lists would, a bar can be both a max and a min
+    is_max = sorted_extrema[2] == 1
+    regrouped = np.hstack((sorted_extrema[:, is_max], sorted_extrema[:, ~is_max]))
+    max_eval, min_eval = eval_sorted_extrema(regrouped[:, regrouped[0].argsort()])
 
-    return max_idx, min_idx
+    return max_idx, min_idx, max_eval, min_eval
 
 
 def get_extrema_eval_for_plot(max_eval: list, min_eval: list) -> tuple[list, list]:
@@ -110,3 +145,130 @@ def get_extrema_analysis(max_idx: list, min_idx: list) -> str:
         max2min, min2max = peak_to_peak_analysis(min_idx, max_idx)
 
     return max2min, min2max
+
+
+def get_macd_signals(macd_hist, ema5, ema20, ema60, psar_diff) -> dict:
+    """MACD bullish / enhanced / weaken signals drawn by PlotInfo.add_macd_analysis
+
+    Takes Series of one ticker or aligned (dates x tickers) DataFrames.
+    """
+    macd_1d_diff = macd_hist - macd_hist.shift(1)
+    macd_2d_diff = macd_hist - macd_hist.shift(2)
+
+    ema_bull = True
+    for ema in [ema5, ema20, ema60]:
+        ema_bull = ema_bull * (ema > ema.shift(1))
+
+    macd_1d_up = (macd_1d_diff > macd_1d_diff.shift(1)).rolling(2).sum()
+    macd_2d_up = (macd_2d_diff > macd_2d_diff.shift(1)).rolling(2).sum()
+    macd_up_idx = (macd_1d_up >= 2) * (macd_2d_up >= 2)
+
+    macd_1d_down = (macd_1d_diff < macd_1d_diff.shift(1)).rolling(2).sum()
+    macd_2d_down = (macd_2d_diff < macd_2d_diff.shift(1)).rolling(2).sum()
+    macd_down_idx = (macd_1d_down >= 2) * (macd_2d_down >= 2)
+
+    macd_turn_signal = np.where(macd_1d_diff < 0, 0, 1) * np.where(
+        macd_2d_diff < 0, 0, 1
+    )
+    psar_signal = psar_diff > 0
+    soft_rules = ema_bull + psar_signal
+    bull_idx = (macd_turn_signal > 0) * soft_rules
+
+    return {
+        "macd_1d_diff": macd_1d_diff,
+        "macd_2d_diff": macd_2d_diff,
+        "bull_idx": bull_idx,
+        "macd_up_idx": macd_up_idx,
+        "macd_down_idx": macd_down_idx,
+    }
+
+
+def get_extrema_panel_stats(
+    high: pd.DataFrame, low: pd.DataFrame, order: int = 4
+) -> pd.DataFrame:
+    """Swing statistics for every ticker column of aligned (dates x tickers) panels
+
+    Same extrema and cleaning as get_extrema_for_plot on each ticker's listed
+    span, found for all columns at once.
+    """
+    high_values = high.to_numpy(dtype=np.float64)
+    low_values = low.to_numpy(dtype=np.float64)
+    n_cols = high_values.shape[1]
+
+    # Outside its listed span a column repeats its first / last bar, which is
+    # what argrelmax's clipping compares the span's edge bars with. Searched
+    # as (tickers x dates), so the hits come out by ticker, then by date
+    listed = ~np.isnan(high_values)
+    n_bars = len(high_values)
+    first = np.where(listed.any(axis=0), np.argmax(listed, axis=0), 0)
+    last = n_bars - 1 - np.argmax(listed[::-1], axis=0)
+    edge = np.clip(np.arange(n_bars), first[:, None], last[:, None])
+    max_cols, max_rows = argrelmax(
+        np.take_along_axis(high_values.T, edge, axis=1), axis=1, order=order
+    )
+    min_cols, min_rows = argrelmin(
+        np.take_along_axis(low_values.T, edge, axis=1), axis=1, order=order
+    )
+
+    # Tickers need at least one max and one min
+    both = (np.bincount(max_cols, minlength=n_cols) > 0) & (
+        np.bincount(min_cols, minlength=n_cols) > 0
+    )
+    keep_max = both[max_cols]
+    keep_min = both[min_cols]
+    merged_idx = np.concatenate((max_rows[keep_max], min_rows[keep_min]))
+    merged_col = np.concatenate((max_cols[keep_max], min_cols[keep_min]))
+    merged_val = np.concatenate(
+        (
+            high_values[max_rows[keep_max], max_cols[keep_max]],
+            low_values[min_rows[keep_min], min_cols[keep_min]],
+        )
+    )
+    merged_type = np.concatenate((np.ones(keep_max.sum()), np.zeros(keep_min.sum())))
+    stacked_array = np.vstack((merged_idx, merged_val, merged_type, merged_col))
+    sorted_extrema = stacked_array[
+        :, np.argsort(merged_col * n_bars + merged_idx, kind="stable")
+    ]
+    if sorted_extrema.shape[1] == 0:
+        return pd.DataFrame()
+    sorted_extrema = clean_sorted_extrema(sorted_extrema, sorted_extrema[3])
+    idx, val, kind, col = sorted_extrema
+    col = col.astype(int)
+
+    # Consecutive extrema of the same ticker, cleaned ones alternate in type
+    same = col[1:] == col[:-1]
+    step_col = col[1:][same]
+    swings = ((val[1:] - val[:-1]) / val[:-1] * 100)[same]
+    gaps = (idx[1:] - idx[:-1])[same]
+    to_max = kind[1:][same] == 1
+
+    # get_extrema_analysis pairs the extrema from the last one backwards, so
+    # the first gap is left out when a ticker starts and ends on the same type
+    n_extrema = np.bincount(col, minlength=n_cols)
+    first_step = np.concatenate(([True], step_col[1:] != step_col[:-1]))
+    counted = ~(first_step & (n_extrema[step_col] % 2 == 1))
+
+    def column_mean(values, mask):
+        total = np.bincount(step_col[mask], values[mask], minlength=n_cols)
+        count = np.bincount(step_col[mask], minlength=n_cols)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / count, np.nan)
+
+    ends = np.flatnonzero(np.append(col[1:] != col[:-1], True))
+    last_is_max = np.zeros(n_cols, dtype=bool)
+    last_is_max[col[ends]] = kind[ends] == 1
+
+    listed_cols = np.flatnonzero(n_extrema)
+    stats = pd.DataFrame(
+        {
+            "n_extrema": n_extrema,
+            "mean_rise": column_mean(swings, swings > 0),
+            "mean_drop": column_mean(swings, swings <= 0),
+            "max2min_days": column_mean(gaps, counted & ~to_max),
+            "min2max_days": column_mean(gaps, counted & to_max),
+            "last_is_max": last_is_max,
+        },
+        index=high.columns,
+    )
+
+    return stats.iloc[listed_cols]
@@ -1,6 +1,5 @@
-import os
-import json
-from datetime import datetime, timedelta
+from datetime import timedelta
+from functools import lru_cache
 
 import numpy as np
 import pandas as pd
@@ -8,58 +7,169 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import yfinance as yf
 
-from scripts.indicators import calculate_psar
+from scripts import profiling
+from scripts.figure_dict import FAST_FIGURES, FigureDict
+from scripts.forecast_store import ForecastStore
+from scripts.incremental import ExtremaState
+from scripts.indicator_registry import compute_indicators
+from scripts.indicators import psar_arrays
+from scripts.option_analytics import FORECAST_EXPIRIES, forecast_cone, near_move_percent
+from scripts.price_store import PriceStore
 from scripts.stock_analysis import (
-    eval_max_min,
     get_extrema_analysis,
     get_extrema_eval_for_plot,
-    get_extrema_idx_for_plot,
+    get_extrema_for_plot,
+    get_macd_signals,
 )
 
+RANGEBREAKS = [dict(bounds=["sat", "mon"])]
+
+# PlotInfo column -> indicator registry name
+PLOT_INDICATORS = {
+    "chg": "chg",
+    "5ma": "ma5",
+    "10ma": "ma10",
+    "20ma": "ma20",
+    "5ema": "ema5",
+    "12ema": "ema12",
+    "20ema": "ema20",
+    "26ema": "ema26",
+    "60ema": "ema60",
+    "std": "std20",
+    "upper_bb": "upper_bb",
+    "lower_bb": "lower_bb",
+    "macd": "macd",
+    "macd_signal": "macd_signal",
+    "macd_hist": "macd_hist",
+    "psar": "psar",
+    "psar_diff": "psar_diff",
+}
+
+
+def candle_subplots(title: str) -> go.Figure:
+    """Empty five row grid of the candle chart: candles, Vol, SAR, MACD, MACD diff."""
+    fig = make_subplots(
+        rows=5,
+        cols=1,
+        shared_xaxes=True,
+        # subplot_titles=("Candle Chart", "Volume", "PSAR"),
+        vertical_spacing=0.01,
+        row_width=[0.1, 0.1, 0.1, 0.1, 0.6],
+    )
+
+    fig.update_yaxes(type="log", title_text="Candles(log)", row=1, col=1)
+    fig.update_yaxes(title_text="Vol", row=2, col=1)
+    fig.update_yaxes(title_text="SAR", row=3, col=1)
+    fig.update_yaxes(title_text="MACD", row=4, col=1)
+    # fig.update_yaxes(title_text="MACD_diff", row=5, col=1)
+
+    fig.update_layout(
+        autosize=True,
+        title={"text": title},
+        xaxis_rangeslider_visible=False,
+        height=600,
+    )
+
+    return fig
+
+
+def button_menu(buttons: list) -> dict:
+    return dict(
+        type="buttons",
+        direction="right",
+        x=1,
+        xanchor="right",
+        y=1.2,
+        yanchor="top",
+        buttons=buttons,
+    )
+
+
+def style_peak2peak(fig):
+    fig.update_layout(
+        title=dict(text="Peak to peak analysis", font=dict(size=10)),
+        yaxis_title="days",
+        margin=dict(l=10, r=10, t=40, b=10),
+        legend=dict(
+            font=dict(size=10),
+            orientation="h",
+            yanchor="bottom",
+            y=1,
+            xanchor="right",
+            x=1,
+        ),
+    )
+
+
+@lru_cache(maxsize=None)
+def candle_layout() -> dict:
+    """Candle chart layout made once by plotly, the fast path only fills it in.
+
+    The calls follow generate_candle_plot so the keys come out in the same order.
+    """
+    fig = candle_subplots("")
+    fig.update_layout(updatemenus=[button_menu([])])
+    fig.update_layout(xaxis=dict(rangebreaks=RANGEBREAKS))
+
+    return fig.to_plotly_json()["layout"]
+
+
+@lru_cache(maxsize=None)
+def peak2peak_layout() -> dict:
+    fig = go.Figure()
+    style_peak2peak(fig)
+
+    return fig.to_plotly_json()["layout"]
+
 
 class PlotInfo:
-    def __init__(self, ticker_object: yf.Ticker, symbol: str, period: str):
-        self.df = ticker_object.history(period=period)
+    def __init__(
+        self,
+        ticker_object: yf.Ticker,
+        symbol: str,
+        period: str,
+        price_store: PriceStore = None,
+        extrema_state: ExtremaState = None,
+        forecast_store: ForecastStore = None,
+    ):
+        if price_store is not None:
+            self.df = price_store.history(symbol, period, ticker_object)
+        else:
+            self.df = ticker_object.history(period=period)
         self.ticker_object = ticker_object
         self.symbol = symbol
         self.candle_title = symbol
         self.cal_technical_indicators()
         # self.candle = self.add_basic_candles()
         self.extrema_data = {}
+        self.extrema_state = extrema_state
         self.forecast_folder = "past_forecast"
+        # Page builds share the run's store, opened once
+        if forecast_store is None:
+            forecast_store = ForecastStore(f"{self.forecast_folder}/forecasts.db")
+        self.forecast_store = forecast_store
         self.macd_analysis = {}
 
     def cal_technical_indicators(self):
-        self.df["chg"] = 100 * (1 - self.df["Close"].shift(1) / self.df["Close"])
-        self.df["5ma"] = self.df["Close"].rolling(5).mean()
-        self.df["10ma"] = self.df["Close"].rolling(10).mean()
-        self.df["20ma"] = self.df["Close"].rolling(20).mean()
-        self.df["5ema"] = self.df["Close"].ewm(span=5).mean()
-        self.df["12ema"] = self.df["Close"].ewm(span=12).mean()
-        self.df["20ema"] = self.df["Close"].ewm(span=20).mean()
-        self.df["26ema"] = self.df["Close"].ewm(span=26).mean()
-        self.df["60ema"] = self.df["Close"].ewm(span=60).mean()
-        self.df["std"] = self.df["Close"].rolling(20).std()
-        self.df["upper_bb"] = self.df["20ma"] + 2 * self.df["std"]
-        self.df["lower_bb"] = self.df["20ma"] - 2 * self.df["std"]
+        indicators = compute_indicators(self.df, PLOT_INDICATORS.values())
+        indicators.columns = list(PLOT_INDICATORS)
+        self.df = pd.concat([self.df, indicators], axis=1)
         return
 
-    def add_basic_candles(self) -> go.Figure:
+    def add_basic_candles(self, fast=False) -> go.Figure:
         for i in [10, 20]:
             chg_mean = round(self.df["chg"].tail(i).abs().mean(), 1)
             self.candle_title += f", {i}d +- {chg_mean}%"
 
-        fig = make_subplots(
-            rows=5,
-            cols=1,
-            shared_xaxes=True,
-            # subplot_titles=("Candle Chart", "Volume", "PSAR"),
-            vertical_spacing=0.01,
-            row_width=[0.1, 0.1, 0.1, 0.1, 0.6],
-        )
+        if fast and FAST_FIGURES:
+            fig = FigureDict(candle_layout())
+            fig.update_layout(title={"text": self.symbol})
+        else:
+            fig = candle_subplots(self.symbol)
 
         # Create candlestick plot
-        candlestick = go.Candlestick(
+        candlestick = dict(
+            type="candlestick",
             x=self.df.index,
             open=self.df["Open"],
             high=self.df["High"],
@@ -81,10 +191,11 @@ class PlotInfo:
         self.df.loc[~green_vol, "vol_color"] = "red"
 
         fig.add_trace(
-            go.Bar(
+            dict(
+                type="bar",
                 x=self.df.index,
                 y=self.df["Volume"],
-                marker_color=self.df["vol_color"],
+                marker=dict(color=self.df["vol_color"]),
                 showlegend=False,
             ),
             row=2,
@@ -92,112 +203,58 @@ class PlotInfo:
         )
 
         # Create macd
-        self.df["macd"] = (self.df["12ema"] - self.df["26ema"]) / self.df["26ema"]
-        self.df["macd_signal"] = self.df["macd"].ewm(span=9).mean()
-        self.df["macd_hist"] = self.df["macd"] - self.df["macd_signal"]
-
         self.df["macd_color"] = ""
         green_macd = self.df["macd_hist"] > self.df["macd_hist"].shift()
         self.df.loc[green_macd, "macd_color"] = "green"
         self.df.loc[~green_macd, "macd_color"] = "red"
 
         fig.add_trace(
-            go.Bar(
+            dict(
+                type="bar",
                 x=self.df.index,
                 y=self.df["macd_hist"],
-                marker_color=self.df["macd_color"],
+                marker=dict(color=self.df["macd_color"]),
                 showlegend=False,
             ),
             row=4,
             col=1,
         )
 
-        fig.update_yaxes(type="log", title_text="Candles(log)", row=1, col=1)
-        fig.update_yaxes(title_text="Vol", row=2, col=1)
-        fig.update_yaxes(title_text="SAR", row=3, col=1)
-        fig.update_yaxes(title_text="MACD", row=4, col=1)
-        # fig.update_yaxes(title_text="MACD_diff", row=5, col=1)
-
-        fig.update_layout(
-            autosize=True,
-            title={"text": self.symbol},
-            xaxis_rangeslider_visible=False,
-            height=600,
-        )
-
         return fig
 
     def update_forecast_data(self) -> float:
-        if os.path.exists(f"{self.forecast_folder}/{self.symbol}.json"):
-            with open(f"{self.forecast_folder}/{self.symbol}.json", "r") as f:
-                forecast_data = json.load(f)
-        else:
-            forecast_data = {}
-
-        # if self.df.index[-1] in forecast_data:
-        #     return
-
-        if len(forecast_data) >= 5:
-            oldest_date = min(forecast_data.keys())
-            del forecast_data[oldest_date]
-
-        op_dates = self.ticker_object.options
+        """Store today's IV cone over the fetched expiries, return the near move in %.
 
-        upper = []
-        lower = []
-        date = []
+        None when no expiry has a usable implied vol (no options, empty or
+        illiquid chains); nothing is stored then.
+        """
         last_date = pd.Timestamp(self.df.index[-1]).strftime("%Y-%m-%d")
-        # last_date = last_date.strftime("%Y-%m-%d")
-        last_date = datetime.strptime(last_date, "%Y-%m-%d")
-        near_iv_amplitude = 0
-
-        # Option contracts in 5 weeks (35 days)
-        for i in [0, 1, 2, 3, 4]:
-            call_chain = self.ticker_object.option_chain(op_dates[i]).calls
-            call_idx = sum(call_chain["inTheMoney"]) - 1
-            call_strike = call_chain.iloc[call_idx]["strike"]
-            call_iv = call_chain.iloc[call_idx]["impliedVolatility"]
-
-            put_chain = self.ticker_object.option_chain(op_dates[i]).puts
-            put_idx = -sum(put_chain["inTheMoney"])
-            put_strike = put_chain.iloc[put_idx]["strike"]
-            put_iv = put_chain.iloc[put_idx]["impliedVolatility"]
-
-            days = (datetime.strptime(op_dates[i], "%Y-%m-%d") - last_date).days
-            strike = (call_strike + put_strike) / 2
-            iv = (call_iv + put_iv) / 2
-            forecast_std = iv * strike * np.sqrt(days / 365)
-
-            if not upper:
-                date.append(last_date.strftime("%Y-%m-%d"))
-                upper.append(strike)
-                lower.append(strike)
-                near_iv_amplitude = int(1e4 * (forecast_std / strike)) / 1e2
-
-            date.append(op_dates[i])
-            upper.append(strike + forecast_std)
-            lower.append(strike - forecast_std)
-
-        forecast_data[last_date.strftime("%Y-%m-%d")] = {
-            "date": date,
-            "upper": upper,
-            "lower": lower,
-        }
-
-        with open(f"{self.forecast_folder}/{self.symbol}.json", "w") as f:
-            json.dump(forecast_data, f)
+        spot = float(self.df["Close"].iloc[-1])
+
+        # One request per expiry, calls and puts come back together
+        expiries = self.ticker_object.options[:FORECAST_EXPIRIES]
+        chains = {date: self.ticker_object.option_chain(date) for date in expiries}
+        cone = forecast_cone(chains, spot, last_date)
+        if not len(cone["date"]):
+            return None
+
+        # Step 0 is the spot on the forecast date, one step per expiry after it
+        self.forecast_store.add(
+            self.symbol,
+            last_date,
+            [last_date, *cone["date"].tolist()],
+            [spot, *cone["upper"].tolist()],
+            [spot, *cone["lower"].tolist()],
+        )
 
-        return near_iv_amplitude
+        return near_move_percent(cone)
 
     def add_forecast(self, fig) -> go.Figure:
         near_iv_amplitude = self.update_forecast_data()
-        self.candle_title += f", IV forecast +- {near_iv_amplitude}%"
+        if near_iv_amplitude is not None:
+            self.candle_title += f", IV forecast +- {near_iv_amplitude}%"
 
-        if os.path.exists(f"{self.forecast_folder}/{self.symbol}.json"):
-            with open(f"{self.forecast_folder}/{self.symbol}.json", "r") as f:
-                forecast_data = json.load(f)
-        else:
-            return fig
+        forecast_data = self.forecast_store.recent(self.symbol, last=5)
 
         colour_set = {
             "grey": "rgba(100, 100, 100, ",
@@ -212,7 +269,8 @@ class PlotInfo:
         for data, colour in zip(forecast_data.values(), colour_set.values()):
             pred_date = data["date"][0][-5:]
             fig.add_trace(
-                go.Scatter(
+                dict(
+                    type="scatter",
                     x=data["date"],
                     y=data["upper"],
                     mode="lines+markers",
@@ -226,7 +284,8 @@ class PlotInfo:
             )
 
             fig.add_trace(
-                go.Scatter(
+                dict(
+                    type="scatter",
                     x=data["date"],
                     y=data["lower"],
                     mode="lines+markers",
@@ -253,7 +312,8 @@ class PlotInfo:
 
         for ma, color in ma_pairs:
             ma_analysis.append(
-                go.Scatter(
+                dict(
+                    type="scatter",
                     x=self.df.index,
                     y=self.df[ma],
                     line=dict(color=color, width=0.8),
@@ -262,7 +322,8 @@ class PlotInfo:
             )
 
         ma_analysis.append(
-            go.Scatter(
+            dict(
+                type="scatter",
                 x=self.df.index,
                 y=self.df["20ma"] + (self.df["std"] * 2),
                 # line=dict(color="#a9e5fc", width=0.5),
@@ -272,7 +333,8 @@ class PlotInfo:
         )
 
         ma_analysis.append(
-            go.Scatter(
+            dict(
+                type="scatter",
                 x=self.df.index,
                 y=self.df["20ma"] - (self.df["std"] * 2),
                 line=dict(color="#689be3", width=0.5),
@@ -292,9 +354,12 @@ class PlotInfo:
         return fig
 
     def add_min_max_analysis(self, fig, order) -> go.Figure:
-        max_idx, min_idx = get_extrema_idx_for_plot(order, self.df)
-
-        max_eval, min_eval = eval_max_min(max_idx, min_idx, self.df)
+        raw_idx = None
+        if self.extrema_state is not None:
+            raw_idx = self.extrema_state.window_idx(self.df, order)
+        max_idx, min_idx, max_eval, min_eval = get_extrema_for_plot(
+            order, self.df, raw_idx
+        )
         max_eval_str, min_eval_str = get_extrema_eval_for_plot(max_eval, min_eval)
 
         self.extrema_data = {
@@ -304,7 +369,8 @@ class PlotInfo:
             "min_eval": min_eval,
         }
 
-        scatter_minima = go.Scatter(
+        scatter_minima = dict(
+            type="scatter",
             x=self.df.index[min_idx],
             y=self.df["Low"].iloc[min_idx],
             mode="markers+text",
@@ -314,7 +380,8 @@ class PlotInfo:
             textposition="bottom center",
         )
 
-        scatter_maxima = go.Scatter(
+        scatter_maxima = dict(
+            type="scatter",
             x=self.df.index[max_idx],
             y=self.df["High"].iloc[max_idx],
             mode="markers+text",
@@ -339,7 +406,17 @@ class PlotInfo:
         return fig
 
     def add_psar(self, fig, af_step=0.02, af_max=0.2) -> go.Figure:
-        self.df = calculate_psar(self.df, af_step, af_max)
+        # cal_technical_indicators has PSAR with the default acceleration
+        if (af_step, af_max) != (0.02, 0.2):
+            self.df["psar"], _, _, _ = psar_arrays(
+                self.df["High"].to_numpy(),
+                self.df["Low"].to_numpy(),
+                self.df["Close"].to_numpy(),
+                af_step,
+                af_max,
+            )
+            close = self.df["Close"]
+            self.df["psar_diff"] = (close - self.df["psar"]) / close
 
         # Compare each number with the previous one and set the color flag accordingly
         green_mask = self.df["psar_diff"] > self.df["psar_diff"].shift()
@@ -348,7 +425,8 @@ class PlotInfo:
         self.df.loc[~green_mask, "psar_color"] = "red"
 
         fig.add_trace(
-            go.Scatter(
+            dict(
+                type="scatter",
                 x=self.df.index,
                 y=self.df["psar"],
                 mode="markers",
@@ -360,10 +438,11 @@ class PlotInfo:
         )
 
         fig.add_trace(
-            go.Bar(
+            dict(
+                type="bar",
                 x=self.df.index,
                 y=self.df["psar_diff"],
-                marker_color=self.df["psar_color"],
+                marker=dict(color=self.df["psar_color"]),
                 showlegend=False,
             ),
             row=3,
@@ -373,48 +452,22 @@ class PlotInfo:
         return fig
 
     def add_macd_analysis(self, fig) -> go.Figure:
-        self.df["ema_bull"] = True
-        self.df[f"macd_1d_diff"] = self.df["macd_hist"] - self.df["macd_hist"].shift(1)
-        self.df[f"macd_2d_diff"] = self.df["macd_hist"] - self.df["macd_hist"].shift(2)
-
-        for i in ["5ema", "20ema", "60ema"]:
-            self.df[f"{i}_bull"] = self.df[i] > self.df[i].shift(1)
-            self.df["ema_bull"] *= self.df[f"{i}_bull"]
-
-        self.df["macd_1d_up"] = (
-            (self.df["macd_1d_diff"] > self.df["macd_1d_diff"].shift(1))
-            .rolling(2)
-            .sum()
-        )
-        self.df["macd_2d_up"] = (
-            (self.df["macd_2d_diff"] > self.df["macd_2d_diff"].shift(1))
-            .rolling(2)
-            .sum()
-        )
-        macd_up_idx = (self.df["macd_1d_up"] >= 2) * (self.df["macd_2d_up"] >= 2)
-
-        self.df["macd_1d_down"] = (
-            (self.df["macd_1d_diff"] < self.df["macd_1d_diff"].shift(1))
-            .rolling(2)
-            .sum()
+        signals = get_macd_signals(
+            self.df["macd_hist"],
+            self.df["5ema"],
+            self.df["20ema"],
+            self.df["60ema"],
+            self.df["psar_diff"],
         )
-        self.df["macd_2d_down"] = (
-            (self.df["macd_2d_diff"] < self.df["macd_2d_diff"].shift(1))
-            .rolling(2)
-            .sum()
-        )
-        macd_down_idx = (self.df["macd_1d_down"] >= 2) * (self.df["macd_2d_down"] >= 2)
-
-        self.df["macd_1d_turn"] = np.where(self.df["macd_1d_diff"] < 0, 0, 1)
-        self.df["macd_2d_turn"] = np.where(self.df["macd_2d_diff"] < 0, 0, 1)
-
-        self.df["macd_turn_signal"] = self.df["macd_1d_turn"] * self.df["macd_2d_turn"]
-        self.df["psar_signal"] = self.df["psar_diff"] > 0
-        soft_rules = self.df["ema_bull"] + self.df["psar_signal"]
-        bull_idx = (self.df["macd_turn_signal"] > 0) * soft_rules
+        self.df["macd_1d_diff"] = signals["macd_1d_diff"]
+        self.df["macd_2d_diff"] = signals["macd_2d_diff"]
+        bull_idx = signals["bull_idx"]
+        macd_up_idx = signals["macd_up_idx"]
+        macd_down_idx = signals["macd_down_idx"]
 
         fig.add_trace(
-            go.Scatter(
+            dict(
+                type="scatter",
                 x=self.df.index[bull_idx],
                 y=self.df["5ma"][bull_idx],
                 mode="markers",
@@ -426,7 +479,8 @@ class PlotInfo:
         )
 
         fig.add_trace(
-            go.Scatter(
+            dict(
+                type="scatter",
                 x=self.df.index[macd_up_idx],
                 y=self.df["5ma"][macd_up_idx] * 0.95,
                 mode="markers",
@@ -438,7 +492,8 @@ class PlotInfo:
         )
 
         fig.add_trace(
-            go.Scatter(
+            dict(
+                type="scatter",
                 x=self.df.index[macd_down_idx],
                 y=self.df["5ma"][macd_down_idx] * 1.05,
                 mode="markers",
@@ -457,7 +512,8 @@ class PlotInfo:
 
         for bar_plot in ["macd_1d_diff", "macd_2d_diff"]:
             fig.add_trace(
-                go.Bar(
+                dict(
+                    type="bar",
                     x=self.df.index,
                     y=self.df[bar_plot],
                     name=bar_plot,
@@ -534,31 +590,27 @@ class PlotInfo:
                 )
             )
 
-        fig.update_layout(
-            updatemenus=[
-                dict(
-                    type="buttons",
-                    direction="right",
-                    x=1,
-                    xanchor="right",
-                    y=1.2,
-                    yanchor="top",
-                    buttons=buttons,
-                )
-            ]
-        )
+        fig.update_layout(updatemenus=[button_menu(buttons)])
 
         return fig
 
-    def generate_candle_plot(self, p2p_order=4) -> go.Figure:
-        fig = self.add_basic_candles()
-        fig = self.add_forecast(fig)
-        fig = self.add_ma_analysis(fig)
-        fig = self.add_min_max_analysis(fig, order=p2p_order)
-        fig = self.add_psar(fig)
-        fig = self.add_macd_analysis(fig)
-        fig = self.add_button(fig)
-        fig.update_layout(xaxis=dict(rangebreaks=[dict(bounds=["sat", "mon"])]))
+    def generate_candle_plot(self, p2p_order=4, fast=False) -> go.Figure:
+        """Main candle chart; fast=True builds a FigureDict with the same JSON."""
+        with profiling.span("candles", self.symbol):
+            fig = self.add_basic_candles(fast)
+        with profiling.span("forecast", self.symbol):
+            fig = self.add_forecast(fig)
+        with profiling.span("moving_averages", self.symbol):
+            fig = self.add_ma_analysis(fig)
+        with profiling.span("extrema", self.symbol):
+            fig = self.add_min_max_analysis(fig, order=p2p_order)
+        with profiling.span("psar", self.symbol):
+            fig = self.add_psar(fig)
+        with profiling.span("macd", self.symbol):
+            fig = self.add_macd_analysis(fig)
+        with profiling.span("buttons", self.symbol):
+            fig = self.add_button(fig)
+        fig.update_layout(xaxis=dict(rangebreaks=RANGEBREAKS))
         fig.update_layout(title=self.candle_title)
 
         return fig
@@ -590,7 +642,7 @@ class PlotInfo:
             ],
         }
 
-        fig.update_layout(xaxis=dict(rangebreaks=[dict(bounds=["sat", "mon"])]), **args)
+        fig.update_layout(xaxis=dict(rangebreaks=RANGEBREAKS), **args)
         fig.update_layout(title=self.candle_title)
 
         return fig
@@ -602,40 +654,38 @@ class PlotInfo:
         fig = self.add_psar(fig)
         fig = self.add_macd_analysis(fig)
         fig = self.add_button(fig)
-        fig.update_layout(xaxis=dict(rangebreaks=[dict(bounds=["sat", "mon"])]))
+        fig.update_layout(xaxis=dict(rangebreaks=RANGEBREAKS))
         fig.update_layout(title=self.candle_title)
 
         return fig
 
-    def generate_peak2peak_plot(self) -> go.Figure:
+    def generate_peak2peak_plot(self, fast=False) -> go.Figure:
         max2min, min2max = get_extrema_analysis(
             self.extrema_data["max_idx"], self.extrema_data["min_idx"]
         )
 
-        fig = go.Figure()
+        fast = fast and FAST_FIGURES
+        fig = FigureDict(peak2peak_layout()) if fast else go.Figure()
         fig.add_trace(
-            go.Scatter(
-                y=max2min, mode="lines+markers", line_color="red", name="max2min"
+            dict(
+                type="scatter",
+                y=max2min,
+                mode="lines+markers",
+                line=dict(color="red"),
+                name="max2min",
             )
         )
         fig.add_trace(
-            go.Scatter(
-                y=min2max, mode="lines+markers", line_color="green", name="min2max"
+            dict(
+                type="scatter",
+                y=min2max,
+                mode="lines+markers",
+                line=dict(color="green"),
+                name="min2max",
             )
         )
 
-        fig.update_layout(
-            title=dict(text="Peak to peak analysis", font=dict(size=10)),
-            yaxis_title="days",
-            margin=dict(l=10, r=10, t=40, b=10),
-            legend=dict(
-                font=dict(size=10),
-                orientation="h",
-                yanchor="bottom",
-                y=1,
-                xanchor="right",
-                x=1,
-            ),
-        )
+        if not fast:
+            style_peak2peak(fig)
 
         return fig
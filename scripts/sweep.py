@@ -0,0 +1,193 @@
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from scripts.backtest import extrema_signals, run_grid
+from scripts.indicators import psar_panel
+from scripts.price_store import PriceStore
+from scripts.stock_analysis import get_macd_signals
+
+FIELDS = ["High", "Low", "Close"]
+
+# Hand tuned defaults: add_psar(0.02, 0.2), the 5/20/60 trend EMAs and p2p_order=4
+DEFAULT_GRID = {
+    "af_step": [0.01, 0.02, 0.03],
+    "af_max": [0.1, 0.2, 0.3],
+    "ema_spans": [[5, 20, 60], [3, 10, 30], [10, 30, 90]],
+    "order": [2, 4, 6, 8],
+}
+
+# Every parameter set is scored on all of these in the same backtest pass
+RULES = {
+    "bull/macd_down": {"entry": "bull_idx", "exit": "macd_down_idx"},
+    "bull/hold5": {"entry": "bull_idx", "hold": 5},
+    "macd_up/macd_down": {"entry": "macd_up_idx", "exit": "macd_down_idx"},
+    "macd_up/hold10": {"entry": "macd_up_idx", "hold": 10},
+    "trough/peak": {"entry": "trough", "exit": "peak"},
+}
+
+# Worker side state: views on the parent's shared memory, and indicators that
+# do not depend on the parameter being swept
+shared = {}
+cache = {}
+
+
+def load_wide(price_store: PriceStore, symbols=None) -> dict:
+    """(dates x tickers) High/Low/Close frames from the price store."""
+    histories = {
+        symbol: price_store.load(symbol) for symbol in symbols or price_store.symbols()
+    }
+    histories = {symbol: df for symbol, df in histories.items() if not df.empty}
+
+    return {
+        field: pd.DataFrame({symbol: df[field] for symbol, df in histories.items()})
+        for field in FIELDS
+    }
+
+
+def share_arrays(frames: dict) -> tuple:
+    """Copy each frame into a shared memory block, return the blocks and their specs."""
+    blocks = []
+    specs = {}
+    for field, frame in frames.items():
+        values = frame.to_numpy(dtype=np.float64)
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=np.float64, buffer=block.buf)[:] = values
+        blocks.append(block)
+        specs[field] = (block.name, values.shape)
+
+    return blocks, specs
+
+
+def attach(specs: dict):
+    """Pool initializer: map the parent's price arrays without copying them."""
+    for field, (name, shape) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        shared[field] = (block, np.ndarray(shape, dtype=np.float64, buffer=block.buf))
+
+
+def cached(key, func):
+    if key not in cache:
+        cache[key] = func()
+    return cache[key]
+
+
+def run_group(af_step: float, af_max: float, param_sets: list) -> list:
+    """Score every parameter set sharing one PSAR setting, PSAR is computed once."""
+    high, low, close = (shared[field][1] for field in FIELDS)
+    close_frame = pd.DataFrame(close)
+
+    psar = psar_panel(high, low, close, af_step, af_max)[0]
+    psar_diff = pd.DataFrame((close - psar) / close)
+
+    def ema(span):
+        return cached(("ema", span), lambda: close_frame.ewm(span=span).mean())
+
+    def macd_hist():
+        macd = (ema(12) - ema(26)) / ema(26)
+        return macd - macd.ewm(span=9).mean()
+
+    rows = []
+    for params in param_sets:
+        signals = get_macd_signals(
+            cached("macd_hist", macd_hist),
+            *[ema(span) for span in params["ema_spans"]],
+            psar_diff,
+        )
+        signals = {
+            name: np.asarray(value, dtype=bool) for name, value in signals.items()
+        }
+        signals.update(
+            cached(
+                ("extrema", params["order"]),
+                lambda: extrema_signals(high, low, params["order"]),
+            )
+        )
+
+        stats = run_grid(close_frame, signals, list(RULES.values()))["stats"]
+        summary = stats.groupby(level="rule").agg(
+            total_return=("total_return", "mean"),
+            sharpe=("sharpe", "median"),
+            max_drawdown=("max_drawdown", "mean"),
+            win_rate=("win_rate", "mean"),
+            n_trades=("n_trades", "sum"),
+        )
+        for rule, metrics in zip(RULES, summary.to_dict("records")):
+            rows.append(
+                {
+                    "af_step": af_step,
+                    "af_max": af_max,
+                    "ema_spans": "/".join(map(str, params["ema_spans"])),
+                    "order": params["order"],
+                    "rule": rule,
+                    **metrics,
+                }
+            )
+
+    return rows
+
+
+def sweep(frames: dict, grid: dict = None, workers: int = None, rank_by="sharpe"):
+    """Run the whole grid over a process pool and return the ranked results."""
+    grid = {**DEFAULT_GRID, **(grid or {})}
+    other_keys = [key for key in grid if key not in ["af_step", "af_max"]]
+    param_sets = [
+        dict(zip(other_keys, values))
+        for values in itertools.product(*(grid[key] for key in other_keys))
+    ]
+    groups = list(itertools.product(grid["af_step"], grid["af_max"]))
+
+    blocks, specs = share_arrays(frames)
+    try:
+        with ProcessPoolExecutor(
+            workers, initializer=attach, initargs=(specs,)
+        ) as pool:
+            results = pool.map(
+                run_group,
+                [af_step for af_step, _ in groups],
+                [af_max for _, af_max in groups],
+                [param_sets] * len(groups),
+            )
+            rows = [row for group_rows in results for row in group_rows]
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    # Rules that ignore a parameter repeat their score, so also rank within each rule
+    table = pd.DataFrame(rows).sort_values(rank_by, ascending=False, kind="stable")
+    table.insert(0, "rank", range(1, len(table) + 1))
+    table.insert(
+        1,
+        "rule_rank",
+        table.groupby("rule")[rank_by].rank(method="min", ascending=False),
+    )
+
+    return table.reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep indicator settings")
+    parser.add_argument("symbols", nargs="*", help="default: every stored symbol")
+    parser.add_argument("--store", default="price_data", help="PriceStore folder")
+    parser.add_argument("--grid", help="JSON file with the grid, keys as DEFAULT_GRID")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--rank-by", default="sharpe")
+    parser.add_argument("--out", default="sweep_results.csv")
+    args = parser.parse_args()
+
+    grid = None
+    if args.grid:
+        with open(args.grid, "r") as f:
+            grid = json.load(f)
+
+    frames = load_wide(PriceStore(args.store), args.symbols)
+    table = sweep(frames, grid, args.workers, args.rank_by)
+    table.to_csv(args.out, index=False)
+    print(table.head(20).to_string(index=False))
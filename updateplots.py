@@ -1,14 +1,33 @@
 from flask import Flask, render_template
+import argparse
 import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
 from pathlib import Path
 
-import plotly
-import json
 import scripts.stock_plots as stock_plots
-from datetime import datetime
-import plotly.express as px
-
-import yfinance as yf
+from scripts import forecast_scoring, profiling
+from scripts.data_source import (
+    RecordingSource,
+    ReplaySource,
+    SnapshotTicker,
+    YFinanceSource,
+)
+from scripts.forecast_store import ForecastStore
+from scripts.option_analytics import FORECAST_EXPIRIES
+from scripts.page_output import (
+    FigureBase,
+    encode_figure,
+    vendor_plotly_js,
+    write_compressed,
+)
+from scripts.price_store import PriceStore, trailing_window
+from scripts.publish import new_build, prune_builds, publish
+from scripts.site_index import content_hash, next_build_time, write_manifest
+from datetime import datetime, timezone
 
 import warnings
 
@@ -17,66 +36,323 @@ warnings.simplefilter(action="ignore", category=FutureWarning)
 app = Flask(__name__)
 
 
-def download_data(stocks):
-    stocks_str = " ".join(stocks)
-    return yf.Tickers(stocks_str)
+def download_data(stocks, source):
+    return source.tickers(stocks)
+
+
+def prefetch_ticker(
+    ticker_object, period, price_store=None, n_expiries=FORECAST_EXPIRIES
+):
+    """Do all network work for one ticker (history and option chains) up front."""
+    symbol = ticker_object.symbol
+    with profiling.span("fetch", symbol):
+        extrema = None
+        if price_store is not None:
+            prices = price_store.history(symbol, "max", ticker_object)
+            history = trailing_window(prices, period)
+            if not prices.empty:
+                with profiling.span("extrema_state", symbol):
+                    extrema = price_store.extrema(symbol, prices)
+        else:
+            history = ticker_object.history(period=period)
+
+        options = ticker_object.options
+        chains = {
+            date: ticker_object.option_chain(date) for date in options[:n_expiries]
+        }
+
+    return SnapshotTicker(history, options, chains, extrema)
+
+
+def build_plots(stock, snapshot, scores, past_days, compact=True, forecast_store=None):
+    """CPU side of one ticker: indicators, figures and JSON encoding.
+
+    scores are the ticker's forecast_scoring.summary rows for small plot 2,
+    forecast_store the run's ForecastStore (it only holds its path, so it can
+    be sent to a worker).
+
+    Compact figures leave out the page's shared layouts and trace styles, the
+    styles they use are returned with them for the page's FigureBase. The
+    profiling records of the build come last, as it may run in a worker.
+    """
+    base = FigureBase(figure_layouts()) if compact else None
+    with profiling.collect() as records, profiling.ticker_memory(stock):
+        with profiling.span("build", stock):
+            with profiling.span("indicators", stock):
+                stock_plot = stock_plots.PlotInfo(
+                    snapshot,
+                    stock,
+                    f"{past_days}d",
+                    extrema_state=snapshot.extrema,
+                    forecast_store=forecast_store,
+                )
+
+            # Main candle plots, built as plain dicts (same JSON as the go.Figure path)
+            with profiling.span("candle_figure", stock):
+                candle = stock_plot.generate_candle_plot(p2p_order=4, fast=True)
+                candle.update_layout(title={"text": stock})
+
+            # Small plot 1: peak to peak
+            with profiling.span("p2p_figure", stock):
+                p2p = stock_plot.generate_peak2peak_plot(fast=True)
+
+            # Small plot 2: how often past IV cones held the close
+            with profiling.span("score_figure", stock):
+                coverage = forecast_scoring.score_figure(scores, fast=True)
+
+            with profiling.span("encode", stock):
+                encoded = (
+                    encode_figure(candle, compact, base, "candle"),
+                    encode_figure(p2p, compact, base, "small1"),
+                    encode_figure(coverage, compact, base, "small2"),
+                )
+
+    return (*encoded, base.styles if compact else {}, records)
+
+
+@lru_cache(maxsize=None)
+def figure_layouts():
+    """The layout each kind of page figure starts from, shared by all tickers."""
+    return {
+        "candle": stock_plots.candle_layout(),
+        "small1": stock_plots.peak2peak_layout(),
+        "small2": forecast_scoring.score_layout(),
+    }
+
+
+def pool_map(pool, func, *iterables):
+    # Both executors keep the input order, so the page layout never changes
+    if pool is None:
+        return list(map(func, *iterables))
+    return list(pool.map(func, *iterables))
 
 
-def analyse_data(stocks, stock_data, past_days):
+def analyse_data(
+    stocks,
+    stock_data,
+    past_days,
+    price_store=None,
+    fetch_pool=None,
+    build_pool=None,
+    compact=True,
+    forecast_store=None,
+):
+    period = f"{past_days}d"
+    snapshots = pool_map(
+        fetch_pool,
+        lambda stock: prefetch_ticker(stock_data[stock], period, price_store),
+        stocks,
+    )
+    fetch_done = time.perf_counter()
+
+    # Score the forecasts the fetched bars have reached, in one merge for the page
+    with profiling.span("score_forecasts"):
+        if forecast_store is None:
+            forecast_store = ForecastStore()
+        histories = {stock: snapshot.df for stock, snapshot in zip(stocks, snapshots)}
+        forecast_scoring.update(forecast_store, histories)
+        scores = forecast_scoring.summary(forecast_store, stocks)
+    stock_scores = [scores[scores["symbol"] == stock] for stock in stocks]
+
+    build = partial(
+        build_plots,
+        past_days=past_days,
+        compact=compact,
+        forecast_store=forecast_store,
+    )
+    plots = pool_map(build_pool, build, stocks, snapshots, stock_scores)
+
     candle_plots = {}
     p2p_plots = {}
-    ai_plots = {}
-    for stock in stocks:
-        stock_plot = stock_plots.PlotInfo(
-            stock_data.tickers[stock], stock, f"{past_days}d"
-        )
+    score_plots = {}
+    figure_base = FigureBase(figure_layouts())
+    for stock, (candle, p2p, coverage, styles, records) in zip(stocks, plots):
+        candle_plots[stock] = candle
+        p2p_plots[stock] = p2p
+        score_plots[stock] = coverage
+        figure_base.update(styles)
+        profiling.add(records)
 
-        # Main candle plots
-        candle = stock_plot.generate_candle_plot(p2p_order=4)
-        candle.update_layout(title={"text": stock})
-        candle_plots[stock] = json.dumps(candle, cls=plotly.utils.PlotlyJSONEncoder)
+    return candle_plots, p2p_plots, score_plots, figure_base, fetch_done
 
-        # Small plot 1: peak to peak
-        p2p = stock_plot.generate_peak2peak_plot()
 
-        # Small plot 2: AI recommendation
-        fig2 = px.scatter(x=[0, 1, 2, 3, 4], y=[0, 1, 4, 9, 16])
-        fig2.update_layout(
-            title=dict(text="AI Grading system Maintaining", font=dict(size=10)),
-            margin=dict(l=10, r=10, t=100, b=10),
+def write_figure_files(fig_folder, candle_plots, p2p_plots, score_plots):
+    os.makedirs(fig_folder, exist_ok=True)
+    for stock, candle in candle_plots.items():
+        payload = (
+            f'{{"candle": {candle}, "small1": {p2p_plots[stock]}, '
+            f'"small2": {score_plots[stock]}}}'
         )
+        write_compressed(f"{fig_folder}/{stock}.json", payload)
 
-        candle_plots[stock] = json.dumps(candle, cls=plotly.utils.PlotlyJSONEncoder)
-        p2p_plots[stock] = json.dumps(p2p, cls=plotly.utils.PlotlyJSONEncoder)
-        ai_plots[stock] = json.dumps(fig2, cls=plotly.utils.PlotlyJSONEncoder)
 
-    return candle_plots, p2p_plots, ai_plots
+def generate_page(
+    html_page,
+    html_path,
+    stocks,
+    past_days,
+    source,
+    price_store=None,
+    fetch_pool=None,
+    build_pool=None,
+    compact=True,
+    lazy=True,
+    vendor_root=None,
+    build_id=None,
+    forecast_store=None,
+):
+    start = time.perf_counter()
+    stock_data = download_data(stocks, source)
 
+    candle_plots, p2p_plots, score_plots, figure_base, fetch_done = analyse_data(
+        stocks,
+        stock_data,
+        past_days,
+        price_store,
+        fetch_pool,
+        build_pool,
+        compact,
+        forecast_store,
+    )
 
-def generate_page(html_page, html_path, stocks, past_days):
-    stock_data = download_data(stocks)
+    # Lazy pages fetch each ticker's figures from /fig/<build>/<page>/<symbol>
+    # on scroll; the build id keeps an open page on the figures (and figure
+    # base styles) it was rendered with while the next build is published
+    page = Path(html_path).stem
+    build_id = build_id or Path(html_path).parent.parent.name
+    if lazy:
+        with profiling.span("write_figures", page=page):
+            write_figure_files(
+                Path(html_path).parent / "fig" / build_id / page,
+                candle_plots,
+                p2p_plots,
+                score_plots,
+            )
 
-    candle_plots, p2p_plots, ai_plots = analyse_data(stocks, stock_data, past_days)
+    # Lazy pages load the shared figure base as a file named by its hash, so
+    # browsers keep it cached across builds while it stays the same
+    figure_base_json = figure_base.to_json() if compact else "{}"
+    figure_base_src = None
+    if lazy and compact:
+        digest = content_hash(figure_base_json.encode("utf-8"))
+        base_folder = Path(html_path).parent / "fig" / "base"
+        os.makedirs(base_folder, exist_ok=True)
+        write_compressed(f"{base_folder}/{digest}.json", figure_base_json)
+        figure_base_json = "{}"
+        figure_base_src = f"/fig/base/{digest}"
 
     update_time = f"Last update: {str(datetime.now())[:-10]} (GMT)"
     stock_in_page = "This page includes: " + " ".join(stocks)
-    with app.app_context():
+    with app.app_context(), profiling.span("render", page=page):
         rendered_template = render_template(
             html_page,
             stock_in_page=stock_in_page,
             update_time=update_time,
-            plots=candle_plots,
+            page=page,
+            build=build_id,
+            stocks=stocks,
+            plots={} if lazy else candle_plots,
             small1=p2p_plots,
-            small2=ai_plots,
+            small2=score_plots,
+            figure_base=figure_base_json,
+            figure_base_src=figure_base_src,
+            plotly_js=vendor_plotly_js(vendor_root or Path(html_path).parent.parent),
         )
 
-        with open(html_path, "w") as static_file:
-            static_file.write(rendered_template)
+    with profiling.span("write_page", page=page):
+        os.makedirs(Path(html_path).parent, exist_ok=True)
+        write_compressed(html_path, rendered_template)
+
+    end = time.perf_counter()
+    print(
+        f"{html_path}: {end - start:.1f}s "
+        f"(fetch {fetch_done - start:.1f}s, build {end - fetch_done:.1f}s)"
+    )
 
     return
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the static dashboard pages")
+    parser.add_argument("--record", help="save every download under this folder")
+    parser.add_argument(
+        "--replay",
+        help="serve downloads from a recorded folder, with scratch price and "
+        "forecast stores",
+    )
+    parser.add_argument("--fetch-workers", type=int, default=8)
+    parser.add_argument("--build-workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--no-compact",
+        dest="compact",
+        action="store_false",
+        help="write plain plotly JSON instead of typed arrays",
+    )
+    parser.add_argument(
+        "--rate", type=float, default=5, help="max yahoo requests per second"
+    )
+    parser.add_argument(
+        "--chain-ttl",
+        type=float,
+        default=600,
+        help="seconds a downloaded option chain is reused for, also by re-runs",
+    )
+    parser.add_argument(
+        "--rebuild-hour",
+        type=int,
+        default=22,
+        help="UTC hour of the daily rebuild, browsers cache the pages until then",
+    )
+    parser.add_argument(
+        "--target",
+        action="append",
+        help="site root to publish to (repeatable), default: PythonAnywhere and .",
+    )
+    parser.add_argument(
+        "--report",
+        help="run report (JSON lines), default: run_report.jsonl in the build",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="record peak memory per ticker with tracemalloc (slower)",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=["cprofile", "pyinstrument"],
+        help="profile the whole run into the build folder, figures are then built "
+        "in this process",
+    )
+    args = parser.parse_args()
+
+    profiling.configure(trace_memory=args.trace_memory)
+    profiler = profiling.start_profiler(args.profile)
+    run_started = datetime.now(timezone.utc)
+    run_start = time.perf_counter()
+
+    if args.replay:
+        source = ReplaySource(args.replay)
+    elif args.record:
+        source = RecordingSource(
+            args.record, max_per_second=args.rate, chain_ttl=args.chain_ttl
+        )
+    else:
+        # Chains are kept on disk for the TTL, a re-run reuses them
+        source = YFinanceSource(
+            max_per_second=args.rate,
+            chain_ttl=args.chain_ttl,
+            chain_folder="option_chains",
+        )
+
+    fetch_pool = ThreadPoolExecutor(max_workers=args.fetch_workers)
+    build_pool = None
+    if args.profile is None:
+        build_pool = ProcessPoolExecutor(
+            max_workers=args.build_workers,
+            initializer=profiling.configure,
+            initargs=(True, args.trace_memory),
+        )
+
     ticker_lists = {
         "mag7": ["NVDA", "META", "MSFT", "AMZN", "TSLA", "GOOG", "AAPL", "NFLX"],
         "ai": ["AMD", "SMCI", "AVGO", "MRVL", "QCOM", "INTC", "TSM", "ASML"],
@@ -85,18 +361,62 @@ if __name__ == "__main__":
         "watch": ["COIN", "U", "UPST", "WOLF", "SPOT", "DELL"],
     }
 
-    # For py anywhere daily tasks
+    # Full histories are kept locally and only the newest bars are downloaded.
+    # Replayed runs keep theirs in a scratch folder, recorded prices and fake
+    # forecasts must not end up in the live stores
+    data_root = tempfile.mkdtemp(prefix="replay-") if args.replay else "."
+    price_store = PriceStore(f"{data_root}/price_data")
+    os.makedirs(f"{data_root}/past_forecast", exist_ok=True)
+    forecast_store = ForecastStore(f"{data_root}/past_forecast/forecasts.db")
+
+    next_build = next_build_time(datetime.now(timezone.utc), args.rebuild_hour)
+
+    # Every page is rendered once into a fresh build folder, then copied into
+    # each site root (py anywhere daily task and local machine) file by file
+    build_dir = new_build("builds")
     for tag, tickers in ticker_lists.items():
         generate_page(
             "homeplots.html",
-            f"/home/edwardcheng/mysite/static_html/{tag}.html",
+            f"{build_dir}/static_html/{tag}.html",
             tickers,
             250,
+            source,
+            price_store,
+            fetch_pool,
+            build_pool,
+            args.compact,
+            vendor_root="builds",
+            build_id=os.path.basename(build_dir),
+            forecast_store=forecast_store,
         )
         print(f"Finished generating {tag}")
+    write_manifest(f"{build_dir}/static_html", next_build)
 
-    # For local machine
-    for tag, tickers in ticker_lists.items():
-        my_file = f"static_html/{tag}.html"
-        generate_page("homeplots.html", my_file, tickers, 250)
-        print(f"Finished generating {tag}")
+    targets = args.target or ["/home/edwardcheng/mysite", "."]
+    with profiling.span("publish"):
+        for target in publish(build_dir, "builds/static/vendor", targets):
+            print(f"Published {build_dir} to {target}")
+    prune_builds("builds")
+
+    fetch_pool.shutdown()
+    if build_pool is not None:
+        build_pool.shutdown()
+    if args.replay:
+        shutil.rmtree(data_root)
+    print(source.report())
+
+    profile_path = profiling.stop_profiler(profiler, f"{build_dir}/profile")
+    report_path = args.report or f"{build_dir}/run_report.jsonl"
+    profiling.write_report(
+        report_path,
+        {
+            "build": build_dir,
+            "started": run_started.isoformat(),
+            "seconds": time.perf_counter() - run_start,
+            "args": vars(args),
+        },
+    )
+    print(profiling.summary())
+    print(f"Run report: {report_path}")
+    if profile_path:
+        print(f"Profile: {profile_path}")